@@ -14,12 +14,31 @@ To use:
 
 3. Run: python3 deploy_automated.py
 
+To deploy several projects unattended (see the example config above main()):
+
+   python3 deploy_automated.py --config deploy_projects.json
+
 """
 
 import os
 import sys
+import json
+import queue
+import re
+import shutil
+import shlex
+import signal
+import time
+import hashlib
 import subprocess
 import getpass
+import argparse
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from pathlib import Path
 
 # Colors for terminal output
@@ -30,128 +49,908 @@ class Colors:
     BLUE = '\033[0;34m'
     NC = '\033[0m'  # No Color
 
+# Steps run concurrently, so each step's output is collected per thread and
+# printed as one block when the step finishes.
+_console_lock = threading.Lock()
+_step_output = threading.local()
+
+def print_lines(lines):
+    """Print under the console lock, clearing the live progress line first."""
+    with _console_lock:
+        clear_progress_line()
+        for line in lines:
+            print(line)
+
+def emit(text=""):
+    lines = getattr(_step_output, 'lines', None)
+    if lines is None:
+        print_lines([text])
+    else:
+        lines.append(text)
+
+def ask(prompt, answer=None):
+    """input() from inside a step: shows the step's output so far first.
+
+    Unattended deploys pass ``answer``, which is logged instead of prompting.
+    """
+    if answer is not None:
+        emit(f"{prompt}{answer}")
+        return answer
+    with _console_lock:
+        clear_progress_line()
+        lines = getattr(_step_output, 'lines', None) or []
+        for line in lines:
+            print(line)
+        lines.clear()
+        return input(prompt)
+
+# Host-wide limits on heavy commands for multi-project deploys ({'pip': semaphore,
+# 'migrate': semaphore}); set in each worker process, empty for a single deploy.
+_slots = {}
+
+@contextmanager
+def concurrency_slot(kind):
+    slot = _slots.get(kind)
+    if slot is None:
+        yield
+        return
+    slot.acquire()
+    try:
+        yield
+    finally:
+        slot.release()
+
 def print_step(step_num, total, message):
-    print(f"{Colors.YELLOW}[{step_num}/{total}] {message}...{Colors.NC}")
+    emit(f"{Colors.YELLOW}[{step_num}/{total}] {message}...{Colors.NC}")
 
 def print_success(message):
-    print(f"{Colors.GREEN}✓ {message}{Colors.NC}")
+    emit(f"{Colors.GREEN}✓ {message}{Colors.NC}")
 
 def print_error(message):
-    print(f"{Colors.RED}✗ {message}{Colors.NC}")
+    emit(f"{Colors.RED}✗ {message}{Colors.NC}")
 
 def print_info(message):
-    print(f"{Colors.BLUE}ℹ {message}{Colors.NC}")
+    emit(f"{Colors.BLUE}ℹ {message}{Colors.NC}")
+
+OUTPUT_MAX_LINES = 5000   # per stream kept by run_command; older lines are dropped
+ERROR_TAIL_LINES = 20     # output lines shown when a checked command fails
+PIP_TIMEOUT = 30 * 60     # seconds
+MANAGE_TIMEOUT = 10 * 60
+
+# Commands currently running, shown on one live status line on a terminal
+_running_commands = {}
+_progress_shown = False
+_progress_thread = None
+# Process groups of running commands with a timeout. They get their own
+# session so a timeout can kill grandchildren too, which also means Ctrl-C
+# doesn't reach them; see kill_running_commands().
+_process_groups = set()
+_cancelled = threading.Event()
+
+def clear_progress_line():
+    """Call with _console_lock held."""
+    global _progress_shown
+    if _progress_shown:
+        sys.stderr.write('\r\033[K')
+        sys.stderr.flush()
+        _progress_shown = False
+
+def _draw_progress():
+    global _progress_shown
+    while True:
+        time.sleep(0.5)
+        if not _running_commands or not _console_lock.acquire(blocking=False):
+            continue
+        try:
+            now = time.perf_counter()
+            parts = []
+            for label, started, last in list(_running_commands.values()):
+                part = f"{label} ({now - started:.0f}s)"
+                if last:
+                    part += f": {last}"
+                parts.append(part)
+            width = max(20, os.get_terminal_size(sys.stderr.fileno()).columns - 1)
+            sys.stderr.write('\r\033[K' + ('  ⏳ ' + ' | '.join(parts))[:width])
+            sys.stderr.flush()
+            _progress_shown = True
+        except (OSError, ValueError):
+            pass
+        finally:
+            _console_lock.release()
+
+def wait_with_usage(proc, timeout=None):
+    """Wait for ``proc`` and return (timed_out, cpu_seconds, peak_rss_mb).
+
+    Uses wait4() so the CPU time and peak RSS are the child's own (including
+    the children it waited for), which stays correct while other steps run
+    commands in parallel. On timeout the child's process group is killed.
+    """
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    timed_out = False
+    while True:
+        pid, status, usage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() > deadline:
+            # kill the whole process group: grandchildren would keep the pipes open
+            os.killpg(proc.pid, signal.SIGKILL)
+            _, status, usage = os.wait4(proc.pid, 0)
+            timed_out = True
+            break
+        time.sleep(0.05)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return timed_out, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+def kill_running_commands():
+    """Kill the commands started in their own process group, and refuse to
+    start new ones. Called when the deploy is interrupted with Ctrl-C."""
+    _cancelled.set()
+    for pgid in list(_process_groups):
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
-def run_command(cmd, check=True, shell=True):
-    """Run a shell command and return the result"""
+def process_usage(pid):
+    """(cpu_seconds, peak_rss_mb) of a running process from /proc, or (0.0, 0.0)."""
     try:
-        result = subprocess.run(
-            cmd,
-            shell=shell,
-            check=check,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        return False, e.stdout, e.stderr
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/status", 'r') as f:
+            peak_kb = next((int(line.split()[1]) for line in f if line.startswith('VmHWM:')), 0)
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK'), peak_kb / 1024
+    except (OSError, ValueError, IndexError):
+        return 0.0, 0.0
 
-def main():
-    print(f"{Colors.BLUE}{'='*50}{Colors.NC}")
-    print(f"{Colors.BLUE}  Automated Django Deployment Script{Colors.NC}")
-    print(f"{Colors.BLUE}  (Database & Model Updates Included){Colors.NC}")
-    print(f"{Colors.BLUE}{'='*50}{Colors.NC}\n")
-    
-    # Configuration
-    # ============================================
-    # Your specific configuration:
-    # ============================================
-    PROJECT_NAME = "myproject"  # Your project folder name
-    PYTHON_VERSION = "3.10"      # Python version (3.9, 3.10, 3.11, etc.)
-    
-    # Auto-detect username, or set manually if needed:
-    # For user: BackendBadminton
-    detected_username = getpass.getuser()
-    USERNAME = detected_username  # Will auto-detect as "BackendBadminton" on PythonAnywhere
-    
-    # Auto-detect project path - check current directory first, then home directory
-    current_dir = Path.cwd()
-    home_dir = Path.home()
-    
-    # Check if we're already in the project directory (has manage.py)
-    if (current_dir / "manage.py").exists():
-        PROJECT_PATH = current_dir
-        print(f"{Colors.YELLOW}✓ Detected project in current directory: {PROJECT_PATH}{Colors.NC}")
-    # Check if project is in a subdirectory (e.g., ~/myproject/myproject/)
-    elif (current_dir / PROJECT_NAME / "manage.py").exists():
-        PROJECT_PATH = current_dir / PROJECT_NAME
-        print(f"{Colors.YELLOW}✓ Detected project in subdirectory: {PROJECT_PATH}{Colors.NC}")
-    # Check nested structure: ~/myproject/myproject/ (Git repo root with nested project)
-    elif (current_dir.parent / PROJECT_NAME / "manage.py").exists() and current_dir.name == PROJECT_NAME:
-        PROJECT_PATH = current_dir
-        print(f"{Colors.YELLOW}✓ Detected nested project structure: {PROJECT_PATH}{Colors.NC}")
-    # Check home directory
-    elif (home_dir / PROJECT_NAME / "manage.py").exists():
-        PROJECT_PATH = home_dir / PROJECT_NAME
-        print(f"{Colors.YELLOW}✓ Detected project in home directory: {PROJECT_PATH}{Colors.NC}")
-    else:
-        PROJECT_PATH = home_dir / PROJECT_NAME
-        print(f"{Colors.YELLOW}⚠ Using default path: {PROJECT_PATH}{Colors.NC}")
-        print(f"{Colors.YELLOW}  Current directory: {current_dir}{Colors.NC}")
-    
-    print(f"{Colors.YELLOW}Configuration:{Colors.NC}")
-    print(f"  Project: {PROJECT_NAME}")
-    print(f"  Username: {USERNAME}")
-    print(f"  Python: {PYTHON_VERSION}")
-    print(f"  Path: {PROJECT_PATH}\n")
-    
-    # Step 1: Check project directory
-    print_step(1, 10, "Checking project directory")
+def record_command(label, seconds, cpu_seconds, peak_rss_mb, success):
+    """Add a command to the running step's profile (see execute_step)."""
+    commands = getattr(_step_output, 'commands', None)
+    if commands is not None:
+        commands.append({'label': label, 'seconds': round(seconds, 3), 'cpu_seconds': round(cpu_seconds, 3),
+                         'peak_rss_mb': round(peak_rss_mb, 1), 'success': success})
+
+def command_label(cmd):
+    """'/home/u/p/venv/bin/python manage.py migrate --noinput' -> 'python manage.py migrate'"""
+    words = str(cmd).split()
+    return ' '.join([os.path.basename(words[0])] + words[1:3]) if words else str(cmd)
+
+def run_command(cmd, check=True, shell=True, timeout=None, interactive=False, label=None):
+    """Run a shell command and return the result
+
+    stdout/stderr are read line by line while the command runs (only the last
+    OUTPUT_MAX_LINES of each are kept) and the running command is shown on a
+    live status line. A command still running after ``timeout`` seconds is
+    killed and counts as failed. If a command run with ``check`` fails, the
+    last few output lines are shown. ``interactive`` commands are attached to
+    the terminal instead, so their output is not captured. ``label`` names
+    the command in progress and error output (default: its first words).
+    """
+    global _progress_thread
+    if _cancelled.is_set():
+        raise KeyboardInterrupt
+    label = label or command_label(cmd)
+    started = time.perf_counter()
+    if interactive:
+        proc = subprocess.Popen(cmd, shell=shell)
+        _, cpu, rss = wait_with_usage(proc)
+        record_command(label, time.perf_counter() - started, cpu, rss, proc.returncode == 0)
+        return proc.returncode == 0, "", ""
+
+    out, err = deque(maxlen=OUTPUT_MAX_LINES), deque(maxlen=OUTPUT_MAX_LINES)
+    tail = deque(maxlen=ERROR_TAIL_LINES)
+    token = object()
+    _running_commands[token] = (label, started, "")
+    if sys.stderr.isatty() and _progress_thread is None:
+        _progress_thread = threading.Thread(target=_draw_progress, daemon=True)
+        _progress_thread.start()
+
+    def read(stream, buffer):
+        for line in stream:
+            buffer.append(line)
+            tail.append(line.rstrip())
+            if line.strip() and token in _running_commands:
+                _running_commands[token] = (label, started, line.strip()[:60])
+        stream.close()
+
+    proc = subprocess.Popen(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, bufsize=1, errors='replace',
+                            start_new_session=timeout is not None)
+    if timeout is not None:
+        _process_groups.add(proc.pid)
+    readers = [threading.Thread(target=read, args=(proc.stdout, out), daemon=True),
+               threading.Thread(target=read, args=(proc.stderr, err), daemon=True)]
+    for reader in readers:
+        reader.start()
+    try:
+        timed_out, cpu, rss = wait_with_usage(proc, timeout)
+    except KeyboardInterrupt:
+        kill_running_commands()
+        raise
+    finally:
+        _process_groups.discard(proc.pid)
+    for reader in readers:
+        reader.join()
+    _running_commands.pop(token, None)
+    if not _running_commands:
+        with _console_lock:
+            clear_progress_line()
+
+    elapsed = time.perf_counter() - started
+    success = proc.returncode == 0 and not timed_out
+    record_command(label, elapsed, cpu, rss, success)
+    if timed_out:
+        err.append(f"{label}: timed out after {timeout}s\n")
+        print_error(f"{label} timed out after {timeout}s")
+    if not success and check:
+        emit(f"{Colors.YELLOW}Last output of {label} ({elapsed:.1f}s):{Colors.NC}")
+        for line in tail:
+            emit(f"    {line}")
+    return success, ''.join(out), ''.join(err)
+
+class StepFailed(Exception):
+    """Raised by a step where the old linear script called sys.exit(1)."""
+
+class Step:
+    def __init__(self, key, number, title, fn, deps=()):
+        self.key = key
+        self.number = number  # shown as [number/10]; None for unnumbered steps
+        self.title = title
+        self.fn = fn
+        self.deps = tuple(deps)
+
+class StepResult:
+    def __init__(self, status, started=None, finished=None, cpu_seconds=0.0, commands=()):
+        self.status = status  # ok, skipped, failed or not run
+        self.started = started
+        self.finished = finished
+        self.cpu_seconds = cpu_seconds  # CPU of the step's own thread
+        self.commands = list(commands)  # record_command() entries
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def child_cpu_seconds(self):
+        return sum(command['cpu_seconds'] for command in self.commands)
+
+    @property
+    def peak_rss_mb(self):
+        return max((command['peak_rss_mb'] for command in self.commands), default=0.0)
+
+    def profile(self, step):
+        return {
+            'title': step.title,
+            'status': self.status,
+            'seconds': round(self.seconds, 3),
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'child_cpu_seconds': round(self.child_cpu_seconds, 3),
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'commands': self.commands,
+        }
+
+def execute_step(step, ctx):
+    _step_output.lines = []
+    _step_output.commands = []
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        if step.number is not None:
+            print_step(step.number, TOTAL_STEPS, step.title)
+        else:
+            emit(f"\n{Colors.YELLOW}{step.title}...{Colors.NC}")
+        status = step.fn(ctx) or 'ok'
+    except StepFailed:
+        status = 'failed'
+    except Exception as e:
+        print_error(f"{step.title} failed: {e}")
+        emit(traceback.format_exc().rstrip())
+        status = 'failed'
+    finished = time.perf_counter()
+    cpu_seconds = time.thread_time() - cpu_started
+    lines, _step_output.lines = _step_output.lines, None
+    commands, _step_output.commands = _step_output.commands, None
+    print_lines(lines)
+    return StepResult(status, started, finished, cpu_seconds, commands)
+
+def run_steps(steps, ctx, max_workers=4):
+    """Run ``steps`` as a dependency graph, independent steps in parallel.
+
+    A failed step stops new steps from starting (the linear script exited
+    at that point); steps already running are allowed to finish. On Ctrl-C
+    the running commands are killed instead of waited for.
+    """
+    results = {}
+    pending = {step.key: step for step in steps}
+    running = {}
+    aborted = False
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while pending or running:
+                if not aborted:
+                    for key, step in list(pending.items()):
+                        if all(dep in results for dep in step.deps):
+                            del pending[key]
+                            running[pool.submit(execute_step, step, ctx)] = step
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    results[step.key] = future.result()
+                    if results[step.key].status == 'failed':
+                        aborted = True
+        except KeyboardInterrupt:
+            # the pool waits for its threads on the way out
+            kill_running_commands()
+            raise
+    for key in pending:
+        results[key] = StepResult('not run')
+    return results
+
+PROFILE_FILE = ".deploy_profile.json"  # next to manage.py
+PROFILE_SLOWER_RATIO = 1.5   # a step this much slower than last deploy is flagged...
+PROFILE_MIN_DELTA = 1.0      # ...if it also lost at least this many seconds
+
+def load_profile(project_path):
+    try:
+        with open(project_path / PROFILE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_profile(project_path, steps, results, wall_seconds):
+    profile = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'wall_seconds': round(wall_seconds, 3),
+        'steps': {step.key: results[step.key].profile(step) for step in steps},
+    }
+    with open(project_path / PROFILE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+
+def slower_than(result, old):
+    """Seconds lost against the previous profile's entry, or None if not flagged."""
+    if not old or result.status != 'ok' or old.get('status') != 'ok':
+        return None
+    delta = result.seconds - old['seconds']
+    if delta >= PROFILE_MIN_DELTA and result.seconds >= old['seconds'] * PROFILE_SLOWER_RATIO:
+        return delta
+    return None
+
+def print_timings(steps, results, wall_seconds, previous=None):
+    old_steps = (previous or {}).get('steps', {})
+    print(f"\n{Colors.YELLOW}Step timings:{Colors.NC}")
+    slower = []
+    for step in steps:
+        result = results[step.key]
+        label = f"[{step.number}/{TOTAL_STEPS}]" if step.number is not None else "[-]"
+        cpu = result.cpu_seconds + result.child_cpu_seconds
+        line = (f"  {label:<7} {step.title:<40} {result.seconds:7.1f}s  cpu {cpu:6.1f}s  "
+                f"rss {result.peak_rss_mb:6.0f}MB  {result.status}")
+        old = old_steps.get(step.key)
+        delta = slower_than(result, old)
+        if delta is not None:
+            slower.append((delta, step, old))
+            line = f"{Colors.YELLOW}{line}  ⚠ +{delta:.1f}s vs last deploy{Colors.NC}"
+        elif old and old.get('status') == 'ok' and result.status == 'ok':
+            line += f"  ({result.seconds - old['seconds']:+.1f}s)"
+        print(line)
+    busy = sum(results[step.key].seconds for step in steps)
+    print(f"  Sum of step times: {busy:.1f}s, wall clock: {wall_seconds:.1f}s, "
+          f"saved by running steps in parallel: {max(0.0, busy - wall_seconds):.1f}s")
+    if previous:
+        print(f"  Last deploy ({previous.get('created', '?')}): wall clock {previous.get('wall_seconds', 0):.1f}s")
+    for delta, step, old in sorted(slower, key=lambda item: item[0], reverse=True):
+        result = results[step.key]
+        print(f"{Colors.YELLOW}  Slower: {step.title} {old['seconds']:.1f}s -> {result.seconds:.1f}s{Colors.NC}")
+        old_commands = {command['label']: command for command in old.get('commands', [])}
+        for command in result.commands:
+            before = old_commands.get(command['label'])
+            if before and command['seconds'] - before['seconds'] >= PROFILE_MIN_DELTA:
+                print(f"      {command['label']}: {before['seconds']:.1f}s -> {command['seconds']:.1f}s")
+
+    costly = sorted((c for step in steps for c in results[step.key].commands), key=lambda c: c['seconds'], reverse=True)
+    if costly:
+        print("  Slowest commands: " + ", ".join(f"{c['label']} {c['seconds']:.1f}s" for c in costly[:3]))
+
+class DeployContext:
+    """Values the steps share; filled in as steps run."""
+
+    def __init__(self, project_name, python_version, username, project_path, settings_profile="performance"):
+        self.project_name = project_name
+        self.python_version = python_version
+        self.username = username
+        self.settings_profile = settings_profile
+        self.project_path = project_path
+        self.original_cwd = Path.cwd()
+        self.venv_path = project_path / "venv"
+        self.venv_python = self.venv_path / "bin" / "python"
+        self.venv_pip = self.venv_path / "bin" / "pip"
+        self.wsgi_file = project_path / "wsgi_config_generated.py"
+        self.answers = {}  # prompt answers for unattended deploys: migrate, continue_migrate, superuser
+        self.django_helper = None  # DjangoHelper once started, False if it couldn't start
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.django_helper:
+            self.django_helper.close()
+
+TOTAL_STEPS = 10
+
+# Run manage.py commands in one warm Django process instead of one process each
+USE_DJANGO_HELPER = True
+
+# Runs inside the venv (argv[1] is the settings module); one JSON request per
+# line on stdin, one JSON reply per line on the original stdout.
+DJANGO_HELPER_SOURCE = r'''
+import io, os, sys, json, importlib, traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+# replies use a private copy of stdout; anything the project prints goes to stderr
+channel = os.fdopen(os.dup(1), 'w', buffering=1)
+os.dup2(2, 1)
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', sys.argv[1])
+
+def reply(**message):
+    channel.write(json.dumps(message) + '\n')
+
+try:
+    import django
+    django.setup()
+except BaseException:
+    reply(ok=False, error=traceback.format_exc())
+    sys.exit(1)
+from django.core.management import call_command
+from django.db import connections, DEFAULT_DB_ALIAS
+
+def migration_state():
+    from django.db.migrations.executor import MigrationExecutor
+    executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return {
+        'pending': ['%s.%s' % (m.app_label, m.name) for m, backwards in plan if not backwards],
+        'applied': sorted('%s.%s' % key for key in executor.loader.applied_migrations),
+    }
+
+def static_files():
+    """Where collectstatic would copy from and to, or None unless it's a plain
+    copy into a local directory (storages with post_process, like the manifest
+    and WhiteNoise ones, need the real collectstatic)."""
+    from django.conf import settings
+    from django.contrib.staticfiles import finders
+    from django.contrib.staticfiles.storage import StaticFilesStorage, staticfiles_storage
+    # staticfiles_storage is lazy; __class__ is the configured storage's class
+    if not settings.STATIC_ROOT or staticfiles_storage.__class__ is not StaticFilesStorage:
+        return None
+    files = {}
+    try:
+        for finder in finders.get_finders():
+            for path, storage in finder.list(['CVS', '.*', '*~']):
+                prefix = getattr(storage, 'prefix', None)
+                name = os.path.join(prefix, path) if prefix else path
+                files.setdefault(name.replace(os.sep, '/'), storage.path(path))  # first finder wins
+    except NotImplementedError:
+        return None
+    return {'root': str(settings.STATIC_ROOT), 'files': files}
+
+def first_id(data):
+    if isinstance(data, dict):
+        data = data.get('results', data.get('data'))
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0].get('id')
+    return None
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(0, -(-len(values) * pct // 100) - 1)]
+
+def benchmark(paths, repeats):
+    """GET each path once cold and ``repeats`` times warm with the test client."""
+    import time
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+    client = Client(HTTP_HOST=host)
+    results = {}
+    for path in paths:
+        url = path
+        if '<id>' in path:
+            response = client.get(path.split('<id>')[0], secure=True)
+            pk = first_id(response.json()) if response.get('Content-Type', '').startswith('application/json') else None
+            if pk is None:
+                results[path] = {'skipped': 'no object to fetch'}
+                continue
+            url = path.replace('<id>', str(pk))
+        timings = []
+        for i in range(repeats + 1):
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+                started = time.perf_counter()
+                response = client.get(url, secure=True)
+                elapsed = (time.perf_counter() - started) * 1000
+            if i == 0:
+                first_ms, first_queries = elapsed, len(queries)
+            else:
+                timings.append(elapsed)
+        results[path] = {
+            'url': url, 'status': response.status_code, 'first_ms': first_ms,
+            'p50_ms': percentile(timings, 50), 'p95_ms': percentile(timings, 95),
+            'queries': first_queries, 'warm_queries': len(queries),
+        }
+    return results
+
+reply(ok=True, django=django.get_version())
+for line in sys.stdin:
+    request = json.loads(line)
+    out, err = io.StringIO(), io.StringIO()
+    importlib.invalidate_caches()  # makemigrations may have written new modules
+    try:
+        with redirect_stdout(out), redirect_stderr(err):
+            if request['op'] == 'migrations':
+                result = migration_state()
+            elif request['op'] == 'static_files':
+                result = static_files()
+            elif request['op'] == 'benchmark':
+                result = benchmark(request['paths'], request['repeats'])
+            else:
+                call_command(*request['args'], stdout=out, stderr=err)
+                result = None
+        reply(ok=True, result=result, stdout=out.getvalue(), stderr=err.getvalue())
+    except BaseException as e:
+        err.write('%s: %s\n' % (type(e).__name__, e))
+        reply(ok=False, result=None, stdout=out.getvalue(), stderr=err.getvalue())
+    finally:
+        connections.close_all()
+'''
+
+class DjangoHelper:
+    """A python process in the venv that calls django.setup() once and then
+    runs management commands through call_command.
+
+    Requests are handled one at a time; steps running in parallel wait for
+    each other here.
+    """
+
+    def __init__(self, venv_python, project_path, settings_module):
+        self.proc = subprocess.Popen(
+            [str(venv_python), '-c', DJANGO_HELPER_SOURCE, settings_module],
+            cwd=str(project_path), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, text=True, bufsize=1, errors='replace')
+        self.lock = threading.Lock()
+        self.replies = queue.Queue()
+        self.stderr_tail = deque(maxlen=ERROR_TAIL_LINES)
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+        ready = self._reply(MANAGE_TIMEOUT)
+        if not ready or not ready.get('ok'):
+            self.close()
+            error = (ready or {}).get('error') or '\n'.join(self.stderr_tail) or 'helper exited'
+            raise RuntimeError(error.strip().split('\n')[-1])
+        self.django_version = ready.get('django')
+
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            try:
+                self.replies.put(json.loads(line))
+            except ValueError:
+                pass
+        self.replies.put(None)
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            self.stderr_tail.append(line.rstrip())
+
+    def _reply(self, timeout):
+        try:
+            return self.replies.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def request(self, label, timeout=None, **payload):
+        """Send one request; None if the helper died or timed out (it is then stopped)."""
+        with self.lock:
+            if self.proc.poll() is not None:
+                return None
+            token = object()
+            started = time.perf_counter()
+            cpu_before, _ = process_usage(self.proc.pid)
+            _running_commands[token] = (label, started, "")
+            try:
+                self.proc.stdin.write(json.dumps(payload) + '\n')
+                self.proc.stdin.flush()
+                reply = self._reply(timeout)
+            except OSError:
+                reply = None
+            finally:
+                _running_commands.pop(token, None)
+            cpu_after, peak_rss = process_usage(self.proc.pid)
+            record_command(label, time.perf_counter() - started, max(0.0, cpu_after - cpu_before),
+                           peak_rss, bool(reply and reply['ok']))
+            if reply is None:
+                self.proc.kill()
+            return reply
+
+    def call(self, args, check=True, timeout=None):
+        """call_command(*args) with run_command's (success, stdout, stderr) result."""
+        label = f"django {args[0]}"
+        reply = self.request(label, timeout=timeout, op='command', args=list(args))
+        if reply is None:
+            reply = {'ok': False, 'stdout': '', 'stderr': f"{label}: helper stopped or timed out after {timeout}s\n"}
+        if not reply['ok'] and check:
+            emit(f"{Colors.YELLOW}Last output of {label}:{Colors.NC}")
+            for line in (reply['stdout'] + reply['stderr']).splitlines()[-ERROR_TAIL_LINES:]:
+                emit(f"    {line}")
+        return reply['ok'], reply['stdout'], reply['stderr']
+
+    def migrations(self, timeout=None):
+        reply = self.request("django migrations", timeout=timeout, op='migrations')
+        return reply['result'] if reply and reply['ok'] else None
+
+    def static_files(self, timeout=None):
+        reply = self.request("django static files", timeout=timeout, op='static_files')
+        return reply['result'] if reply and reply['ok'] else None
+
+    def benchmark(self, paths, repeats, timeout=None):
+        """{path: {url, status, first_ms, p50_ms, p95_ms, queries, warm_queries}} or None."""
+        reply = self.request("django benchmark", timeout=timeout, op='benchmark', paths=list(paths), repeats=repeats)
+        if reply and not reply['ok']:
+            self.stderr_tail.extend(reply['stderr'].splitlines())
+        return reply['result'] if reply and reply['ok'] else None
+
+    def close(self):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+
+def settings_module_for(ctx):
+    """The DJANGO_SETTINGS_MODULE manage.py sets, else the usual locations."""
+    try:
+        with open(ctx.project_path / "manage.py", 'r', encoding='utf-8') as f:
+            for line in f:
+                if 'DJANGO_SETTINGS_MODULE' in line and 'setdefault' in line:
+                    value = line.split(',', 1)[1].strip().rstrip(')').strip()
+                    return value.strip('\'"')
+    except (OSError, IndexError):
+        pass
+    if (ctx.project_path / ctx.project_name / "settings.py").exists():
+        return f"{ctx.project_name}.settings"
+    return "backend.settings"
+
+def django_helper(ctx):
+    """The context's warm DjangoHelper, started on first use; None if unavailable."""
+    if not USE_DJANGO_HELPER:
+        return None
+    with ctx.lock:
+        if ctx.django_helper is None:
+            try:
+                ctx.django_helper = DjangoHelper(ctx.venv_python, ctx.project_path, settings_module_for(ctx))
+                print_info(f"Django {ctx.django_helper.django_version} loaded once for all manage.py commands")
+            except (OSError, RuntimeError) as e:
+                print_info(f"Running manage.py per command (Django helper unavailable: {e})")
+                ctx.django_helper = False
+        helper = ctx.django_helper
+    if helper and helper.proc.poll() is not None:
+        return None
+    return helper or None
+
+def manage(ctx, *args, check=True, timeout=MANAGE_TIMEOUT):
+    """``manage.py <args>`` in the warm helper, or as its own process without one."""
+    helper = django_helper(ctx)
+    if helper is None:
+        return run_command(f"{ctx.venv_python} manage.py {' '.join(args)}", check=check, timeout=timeout)
+    return helper.call(args, check=check, timeout=timeout)
+
+STATIC_MANIFEST = ".deploy_static_manifest.json"  # kept in STATIC_ROOT
+STATIC_WORKERS = 8
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hashed_static_name(name, digest):
+    """'css/app.css' -> 'css/app.<12 hex>.css', like ManifestStaticFilesStorage."""
+    base, ext = os.path.splitext(name)
+    return f"{base}.{digest[:12]}{ext}"
+
+def collect_static_incremental(files, static_root, workers=STATIC_WORKERS):
+    """collectstatic that only copies what changed since the last deploy.
+
+    ``files`` maps each static name to its source path, as found by Django's
+    finders. Sources whose size and mtime match the manifest keep their
+    recorded hash; the rest are hashed in parallel. New and changed files are
+    copied under their own name and a hashed name, and files the previous
+    manifest recorded but which no longer have a source are removed. Also
+    writes staticfiles.json so ManifestStaticFilesStorage can resolve the
+    hashed names.
+    """
+    manifest_path = static_root / STATIC_MANIFEST
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    entries = {}
+    to_hash = []
+    for name, source in files.items():
+        st = os.stat(source)
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        old = previous.get(name)
+        if old and old.get('size') == entry['size'] and old.get('mtime_ns') == entry['mtime_ns']:
+            entry['sha256'] = old['sha256']
+        else:
+            to_hash.append(name)
+        entries[name] = entry
+
+    def copy(name):
+        entry = entries[name]
+        entry['hashed'] = hashed_static_name(name, entry['sha256'])
+        written = 0
+        for target in (static_root / name, static_root / entry['hashed']):
+            old = previous.get(name)
+            if old and old.get('sha256') == entry['sha256'] and target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(files[name], target)
+            written += entry['size']
+        return written
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, digest in zip(to_hash, pool.map(file_sha256, [files[name] for name in to_hash])):
+            entries[name]['sha256'] = digest
+        written = list(pool.map(copy, entries))
+
+    removed = 0
+    for name, old in previous.items():
+        stale = []
+        if name not in entries:
+            stale = [name, old.get('hashed')]
+        elif old.get('hashed') != entries[name]['hashed']:
+            stale = [old.get('hashed')]
+        for target in filter(None, stale):
+            try:
+                (static_root / target).unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    with open(static_root / "staticfiles.json", 'w', encoding='utf-8') as f:
+        json.dump({'paths': {name: entry['hashed'] for name, entry in entries.items()}, 'version': '1.0'}, f)
+
+    return {
+        'scanned': len(entries),
+        'copied': sum(1 for w in written if w),
+        'skipped': sum(1 for w in written if not w),
+        'removed': removed,
+        'bytes': sum(written),
+    }
+
+def migration_state(ctx):
+    """{'pending': [...], 'applied': [...]} as 'app.migration' names, or None."""
+    helper = django_helper(ctx)
+    if helper is not None:
+        return helper.migrations(timeout=MANAGE_TIMEOUT)
+    success, stdout, _ = run_command(f"{ctx.venv_python} manage.py showmigrations --plan", check=False)
+    if not success:
+        return None
+    state = {'pending': [], 'applied': []}
+    for line in stdout.split('\n'):
+        line = line.strip()
+        if line.startswith('[ ]'):
+            state['pending'].append(line[3:].strip())
+        elif line.startswith('[X]'):
+            state['applied'].append(line[3:].strip())
+    return state
+
+# Wheels built by earlier deploys; shared by every venv on the account
+WHEEL_CACHE_DIR = Path.home() / ".cache" / "deploy_wheels"
+FINGERPRINT_FILE = ".requirements_fingerprint.json"  # stored inside the venv
+
+def read_requirement_lines(requirements_file):
+    lines = []
+    with open(requirements_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                lines.append(line)
+    return lines
+
+def dependency_fingerprint(requirements_file, venv_python, venv_pip):
+    """Hash of requirements.txt, the venv's Python version and its installed packages."""
+    with open(requirements_file, 'rb') as f:
+        requirements_hash = hashlib.sha256(f.read()).hexdigest()
+    _, python_version, _ = run_command(f'{venv_python} -c "import sys; print(sys.version)"', check=False)
+    _, frozen, _ = run_command(f"{venv_pip} freeze", check=False)
+    installed = sorted(line.strip() for line in frozen.split('\n') if line.strip())
+    return {
+        'requirements_sha256': requirements_hash,
+        'python': python_version.strip(),
+        'installed_sha256': hashlib.sha256('\n'.join(installed).encode('utf-8')).hexdigest(),
+        'requirements': read_requirement_lines(requirements_file),
+    }
+
+def load_fingerprint(venv_path):
+    try:
+        with open(venv_path / FINGERPRINT_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_fingerprint(venv_path, fingerprint):
+    with open(venv_path / FINGERPRINT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f, indent=2)
+
+def install_from_wheel_cache(venv_pip, args):
+    """Build/download wheels into WHEEL_CACHE_DIR, then install from there only.
+
+    Falls back to a plain pip install if a wheel can't be built.
+    """
+    WHEEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_dir = shlex.quote(str(WHEEL_CACHE_DIR))
+    # --find-links lets pip reuse the wheels it built on earlier deploys
+    success, _, _ = run_command(f"{venv_pip} wheel --wheel-dir {cache_dir} --find-links {cache_dir} {args}",
+                                check=False, timeout=PIP_TIMEOUT)
+    if success:
+        success, _, _ = run_command(f"{venv_pip} install --no-index --find-links {cache_dir} {args}",
+                                    check=False, timeout=PIP_TIMEOUT)
+        if success:
+            return True
+    return run_command(f"{venv_pip} install {args}", timeout=PIP_TIMEOUT)[0]
+
+# Step 1: Check project directory
+def step_check_project(ctx):
+    PROJECT_PATH = ctx.project_path
     if not PROJECT_PATH.exists():
         print_error(f"Project directory not found at {PROJECT_PATH}")
-        print(f"{Colors.YELLOW}Current directory: {Path.cwd()}{Colors.NC}")
-        print(f"{Colors.YELLOW}Please navigate to your project directory or update PROJECT_NAME{Colors.NC}")
-        sys.exit(1)
-    
+        emit(f"{Colors.YELLOW}Current directory: {Path.cwd()}{Colors.NC}")
+        emit(f"{Colors.YELLOW}Please navigate to your project directory or update PROJECT_NAME{Colors.NC}")
+        raise StepFailed()
+
     # Verify manage.py exists
     if not (PROJECT_PATH / "manage.py").exists():
         print_error(f"manage.py not found in {PROJECT_PATH}")
-        print(f"{Colors.YELLOW}Please ensure you're in the correct project directory{Colors.NC}")
-        sys.exit(1)
-    
-    # Save original directory before changing
-    original_cwd = Path.cwd()
-    
+        emit(f"{Colors.YELLOW}Please ensure you're in the correct project directory{Colors.NC}")
+        raise StepFailed()
+
     os.chdir(PROJECT_PATH)
     print_success(f"Project directory found: {PROJECT_PATH}")
-    
-    # Step 2: Create virtual environment
-    print_step(2, 10, "Setting up virtual environment")
-    venv_path = PROJECT_PATH / "venv"
-    if not venv_path.exists():
-        success, _, _ = run_command(f"python{PYTHON_VERSION} -m venv venv")
+
+# Step 2: Create virtual environment
+def step_venv(ctx):
+    if not ctx.venv_path.exists():
+        success, _, _ = run_command(f"python{ctx.python_version} -m venv venv")
         if success:
             print_success("Virtual environment created")
         else:
             print_error("Failed to create virtual environment")
-            sys.exit(1)
+            raise StepFailed()
     else:
-        print(f"{Colors.YELLOW}⚠ Virtual environment already exists{Colors.NC}")
-    
-    # Step 3: Install dependencies
-    print_step(3, 10, "Installing dependencies")
-    venv_python = venv_path / "bin" / "python"
-    venv_pip = venv_path / "bin" / "pip"
-    
+        emit(f"{Colors.YELLOW}⚠ Virtual environment already exists{Colors.NC}")
+
+# Step 3: Install dependencies
+def step_install_dependencies(ctx):
+    PROJECT_PATH = ctx.project_path
+    original_cwd = ctx.original_cwd
+    venv_pip = ctx.venv_pip
+
     if not venv_pip.exists():
         print_error("Virtual environment pip not found")
-        sys.exit(1)
-    
-    run_command(f"{venv_pip} install --upgrade pip", check=False)
-    
+        raise StepFailed()
+
     # Look for requirements.txt - check multiple locations
     requirements_file = None
-    
+
     # Check 1: Original directory (where script was run from)
     original_dir_requirements = original_cwd / "requirements.txt"
     # Check 2: Project path (current directory after os.chdir)
@@ -160,104 +959,183 @@ def main():
     parent_requirements = PROJECT_PATH.parent / "requirements.txt"
     # Check 4: Current working directory (after chdir)
     current_dir_requirements = Path.cwd() / "requirements.txt"
-    
+
     if original_dir_requirements.exists():
         requirements_file = original_dir_requirements
-        print(f"{Colors.YELLOW}Found requirements.txt in original directory: {original_cwd}{Colors.NC}")
+        emit(f"{Colors.YELLOW}Found requirements.txt in original directory: {original_cwd}{Colors.NC}")
     elif current_dir_requirements.exists():
         requirements_file = current_dir_requirements
-        print(f"{Colors.YELLOW}Found requirements.txt in current directory: {Path.cwd()}{Colors.NC}")
+        emit(f"{Colors.YELLOW}Found requirements.txt in current directory: {Path.cwd()}{Colors.NC}")
     elif project_path_requirements.exists():
         requirements_file = project_path_requirements
-        print(f"{Colors.YELLOW}Found requirements.txt in project directory: {PROJECT_PATH}{Colors.NC}")
+        emit(f"{Colors.YELLOW}Found requirements.txt in project directory: {PROJECT_PATH}{Colors.NC}")
     elif parent_requirements.exists():
         requirements_file = parent_requirements
-        print(f"{Colors.YELLOW}Found requirements.txt in parent directory: {PROJECT_PATH.parent}{Colors.NC}")
+        emit(f"{Colors.YELLOW}Found requirements.txt in parent directory: {PROJECT_PATH.parent}{Colors.NC}")
     else:
         print_error(f"requirements.txt not found")
-        print(f"{Colors.YELLOW}Searched in:{Colors.NC}")
-        print(f"  - Original directory: {original_cwd}")
-        print(f"  - Current directory: {Path.cwd()}")
-        print(f"  - Project path: {PROJECT_PATH}")
-        print(f"  - Parent directory: {PROJECT_PATH.parent}")
-        print(f"{Colors.YELLOW}Please ensure requirements.txt exists in one of these locations{Colors.NC}")
-        sys.exit(1)
-    
-    print(f"{Colors.YELLOW}Using requirements.txt from: {requirements_file}{Colors.NC}")
-    success, _, _ = run_command(f"{venv_pip} install -r {requirements_file}")
+        emit(f"{Colors.YELLOW}Searched in:{Colors.NC}")
+        emit(f"  - Original directory: {original_cwd}")
+        emit(f"  - Current directory: {Path.cwd()}")
+        emit(f"  - Project path: {PROJECT_PATH}")
+        emit(f"  - Parent directory: {PROJECT_PATH.parent}")
+        emit(f"{Colors.YELLOW}Please ensure requirements.txt exists in one of these locations{Colors.NC}")
+        raise StepFailed()
+
+    emit(f"{Colors.YELLOW}Using requirements.txt from: {requirements_file}{Colors.NC}")
+
+    previous = load_fingerprint(ctx.venv_path)
+    current = dependency_fingerprint(requirements_file, ctx.venv_python, venv_pip)
+    if previous and all(previous.get(k) == current[k] for k in ('requirements_sha256', 'python', 'installed_sha256')):
+        print_success("Dependencies unchanged since last deploy, skipping pip install")
+        return 'skipped'
+
+    added = [line for line in current['requirements'] if line not in (previous or {}).get('requirements', [])]
+    removed = [line for line in (previous or {}).get('requirements', []) if line not in current['requirements']]
+    # Only the changed lines are installed when the venv is exactly as the last
+    # deploy left it; nested -r/-c/-e options can't be diffed line by line.
+    incremental = (
+        previous is not None
+        and previous.get('python') == current['python']
+        and previous.get('installed_sha256') == current['installed_sha256']
+        and not any(line.startswith('-') for line in current['requirements'] + removed)
+    )
+    with concurrency_slot('pip'):
+        if incremental:
+            print_info(f"requirements.txt changed: {len(added)} added/updated, {len(removed)} removed")
+            if removed:
+                emit(f"{Colors.YELLOW}⚠ Removed requirements stay installed (other packages may need them){Colors.NC}")
+            args = ' '.join(shlex.quote(line) for line in added)
+            success = install_from_wheel_cache(venv_pip, args) if added else True
+        else:
+            run_command(f"{venv_pip} install --upgrade pip", check=False, timeout=PIP_TIMEOUT)
+            success = install_from_wheel_cache(venv_pip, f"-r {shlex.quote(str(requirements_file))}")
+
     if success:
+        # re-read the installed set so the next deploy can compare against it
+        save_fingerprint(ctx.venv_path, dependency_fingerprint(requirements_file, ctx.venv_python, venv_pip))
         print_success("Dependencies installed")
     else:
         print_error("Failed to install dependencies")
-        sys.exit(1)
-    
-    # Step 4: Update settings.py
-    print_step(4, 10, "Updating settings.py for production")
-    
+        raise StepFailed()
+
+# Step 4: Update settings.py
+def step_update_settings(ctx):
+    PROJECT_PATH = ctx.project_path
+    PROJECT_NAME = ctx.project_name
+    USERNAME = ctx.username
+
     # Try to find settings.py in common locations
     settings_locations = [
         PROJECT_PATH / "backend" / "settings.py",
         PROJECT_PATH / PROJECT_NAME / "settings.py",
         PROJECT_PATH / "settings.py",
     ]
-    
+
     settings_file = None
     for loc in settings_locations:
         if loc.exists():
             settings_file = loc
             break
-    
+
     if not settings_file:
         print_error(f"settings.py not found. Searched in:")
         for loc in settings_locations:
-            print(f"  - {loc}")
-        sys.exit(1)
-    
+            emit(f"  - {loc}")
+        raise StepFailed()
+
     print_info(f"Found settings.py at: {settings_file}")
-    
+
     # Read current settings
     with open(settings_file, 'r', encoding='utf-8') as f:
         settings_content = f.read()
-    
-    # Remove old production settings if they exist
-    lines = settings_content.split('\n')
-    new_lines = []
-    skip = False
-    skip_count = 0
-    
-    for i, line in enumerate(lines):
-        if '# ============================================' in line and i + 1 < len(lines) and 'Production Settings' in lines[i + 1]:
-            skip = True
-            skip_count = 0
-        if skip:
-            skip_count += 1
-            # Stop skipping after finding the end (blank line after production settings block)
-            if skip_count > 30 and line.strip() == '':
-                # Check if we've passed the production block
-                if 'if ON_PYTHONANYWHERE:' in '\n'.join(lines[max(0, i-30):i]):
-                    skip = False
-                    continue
-            continue
-        new_lines.append(line)
-    
-    # Add production settings
-    production_settings = f"""
-
-# ============================================
-# PythonAnywhere Production Settings (Auto-generated)
-# ============================================
+
+    middleware_module = '.'.join(settings_file.parent.relative_to(PROJECT_PATH).parts + ("deploy_cache_middleware",))
+    block = production_settings_block(USERNAME, ctx.settings_profile, f"{middleware_module}.CachedAPIMiddleware")
+    new_content = replace_generated_settings(settings_content, block)
+
+    if ctx.settings_profile == "performance":
+        with open(settings_file.parent / "deploy_cache_middleware.py", 'w', encoding='utf-8') as f:
+            f.write(CACHE_MIDDLEWARE_SOURCE)
+
+    if new_content == settings_content:
+        print_success(f"Settings already up to date ({ctx.settings_profile} profile)")
+        return
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        f.write(new_content)
+
+    print_success(f"Settings updated ({ctx.settings_profile} profile)")
+
+SETTINGS_BEGIN = "# >>> deploy_automated.py: production settings >>>"
+SETTINGS_END = "# <<< deploy_automated.py: production settings <<<"
+
+# Read-mostly list endpoints cached per view by the performance profile
+CACHED_API_PREFIXES = ['/api/events/', '/api/completed-events/', '/api/event-results/']
+API_CACHE_SECONDS = 60
+
+CACHE_MIDDLEWARE_SOURCE = '''# Auto-generated by deploy_automated.py (performance settings profile).
+# Overwritten on every deploy.
+from django.conf import settings
+from django.core.cache import caches
+from django.views.decorators.cache import cache_page
+from django.views.decorators.vary import vary_on_headers
+
+
+class CachedAPIMiddleware:
+    """cache_page() for the views under settings.PERF_CACHED_API_PREFIXES.
+
+    Responses live in their own cache alias (settings.PERF_API_CACHE_ALIAS),
+    keyed per Authorization header. Requests with a session cookie are never
+    cached: SessionMiddleware only adds Vary: Cookie after cache_page has
+    stored the response. A successful write to one of those
+    endpoints clears that alias in this worker only; other workers serve
+    their copy until PERF_API_CACHE_SECONDS runs out.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(getattr(settings, 'PERF_CACHED_API_PREFIXES', ()))
+        self.seconds = getattr(settings, 'PERF_API_CACHE_SECONDS', 60)
+        self.alias = getattr(settings, 'PERF_API_CACHE_ALIAS', 'deploy_api')
+        self.cached_views = {}
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS') and request.path.startswith(self.prefixes)
+                and response.status_code < 400):
+            caches[self.alias].clear()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefixes):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        cached = self.cached_views.get(view_func)
+        if cached is None:
+            cached = self.cached_views[view_func] = cache_page(self.seconds, cache=self.alias, key_prefix='api')(
+                vary_on_headers('Authorization')(view_func))
+        return cached(request, *view_args, **view_kwargs)
+'''
+
+def production_settings_block(username, profile, cache_middleware):
+    """The generated settings section for ``profile`` ("basic" or "performance")."""
+    block = f"""{SETTINGS_BEGIN}
+# PythonAnywhere Production Settings (Auto-generated, profile: {profile})
+# Everything between these markers is rewritten on every deploy.
+import os
 ON_PYTHONANYWHERE = 'pythonanywhere.com' in os.environ.get('HTTP_HOST', '')
 if ON_PYTHONANYWHERE:
     DEBUG = False
     ALLOWED_HOSTS = [
-        '{USERNAME}.pythonanywhere.com',
-        'www.{USERNAME}.pythonanywhere.com',
+        '{username}.pythonanywhere.com',
+        'www.{username}.pythonanywhere.com',
     ]
     CORS_ALLOWED_ORIGINS = [
-        "https://{USERNAME}.pythonanywhere.com",
+        "https://{username}.pythonanywhere.com",
     ]
     CSRF_TRUSTED_ORIGINS = [
-        "https://{USERNAME}.pythonanywhere.com",
+        "https://{username}.pythonanywhere.com",
     ]
     LOGGING = {{
         'version': 1,
@@ -278,72 +1156,153 @@ if ON_PYTHONANYWHERE:
         }},
     }}
 """
-    
-    with open(settings_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(new_lines) + production_settings)
-    
-    print_success("Settings updated")
-    
-    # Step 5: Make migrations for model changes
-    print_step(5, 10, "Creating migrations for model changes")
-    
+    if profile == "performance":
+        block += f"""
+    # Performance profile
+    import django
+    for _db in DATABASES.values():
+        _db.setdefault('CONN_MAX_AGE', 600)  # keep connections between requests
+        _db.setdefault('CONN_HEALTH_CHECKS', True)
+    if 'CACHES' not in globals():
+        CACHES = {{
+            'default': {{
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'deploy-default',
+                'TIMEOUT': 300,
+                'OPTIONS': {{'MAX_ENTRIES': 1000}},
+            }},
+        }}
+    # the API cache gets its own alias so invalidating it never touches sessions
+    # or anything else stored in a shared default cache
+    CACHES['deploy_api'] = {{
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'deploy-api',
+        'OPTIONS': {{'MAX_ENTRIES': 1000}},
+    }}
+    PERF_API_CACHE_ALIAS = 'deploy_api'
+    PERF_CACHED_API_PREFIXES = {CACHED_API_PREFIXES!r}
+    PERF_API_CACHE_SECONDS = {API_CACHE_SECONDS}
+    _generated = ['django.middleware.gzip.GZipMiddleware', '{cache_middleware}']
+    MIDDLEWARE = [_generated[0]] + [m for m in MIDDLEWARE if m not in _generated] + [_generated[1]]
+    for _template in TEMPLATES:
+        _options = _template.setdefault('OPTIONS', {{}})
+        if _template['BACKEND'] == 'django.template.backends.django.DjangoTemplates' and 'loaders' not in _options:
+            _loaders = ['django.template.loaders.filesystem.Loader']
+            if _template.get('APP_DIRS'):
+                _loaders.append('django.template.loaders.app_directories.Loader')
+            _template['APP_DIRS'] = False
+            _options['loaders'] = [('django.template.loaders.cached.Loader', _loaders)]
+    # hashed static names only when the deploy script wrote staticfiles.json
+    # itself, and never over a staticfiles backend the project already picked
+    _static_root = globals().get('STATIC_ROOT')
+    if (_static_root and os.path.exists(os.path.join(_static_root, '{STATIC_MANIFEST}'))
+            and 'STATICFILES_STORAGE' not in globals() and 'staticfiles' not in globals().get('STORAGES', {{}})):
+        if django.VERSION >= (4, 2):
+            STORAGES = {{
+                'default': {{'BACKEND': 'django.core.files.storage.FileSystemStorage'}},
+                **globals().get('STORAGES', {{}}),
+                'staticfiles': {{'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'}},
+            }}
+        else:
+            STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+"""
+    return block + SETTINGS_END + "\n"
+
+def remove_legacy_settings(lines):
+    """Drop sections appended by versions of this script without markers:
+    the '# ====' header, ON_PYTHONANYWHERE and its indented if-block."""
+    result = []
+    i = 0
+    while i < len(lines):
+        if (lines[i].startswith('# ====') and i + 1 < len(lines)
+                and 'PythonAnywhere Production Settings' in lines[i + 1]):
+            i += 1
+            while i < len(lines) and lines[i].startswith('#'):
+                i += 1
+            while i < len(lines) and (lines[i].startswith('ON_PYTHONANYWHERE')
+                                      or lines[i].startswith('if ON_PYTHONANYWHERE')
+                                      or not lines[i].strip() or lines[i][0] in ' \t'):
+                i += 1
+            continue
+        result.append(lines[i])
+        i += 1
+    return result
+
+def replace_generated_settings(content, block):
+    """Put ``block`` between the markers in settings ``content``.
+
+    Idempotent: an unchanged block leaves ``content`` as it was.
+    """
+    lines = content.split('\n')
+    if SETTINGS_BEGIN in lines and SETTINGS_END in lines[lines.index(SETTINGS_BEGIN):]:
+        start = lines.index(SETTINGS_BEGIN)
+        end = lines.index(SETTINGS_END, start)
+        return '\n'.join(lines[:start]) + ('\n' if start else '') + block + '\n'.join(lines[end + 1:])
+    lines = remove_legacy_settings(lines)
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return '\n'.join(lines) + '\n\n\n' + block
+
+# Step 5: Make migrations for model changes
+def step_make_migrations(ctx):
     print_info("Checking for model changes...")
-    success, stdout, stderr = run_command(f"{venv_python} manage.py makemigrations --dry-run", check=False)
+    success, stdout, stderr = manage(ctx, "makemigrations", "--dry-run", check=False)
     if success and stdout.strip():
         if "No changes detected" not in stdout:
             print_info("Model changes detected. Creating migrations...")
-            success, stdout, stderr = run_command(f"{venv_python} manage.py makemigrations")
+            success, stdout, stderr = manage(ctx, "makemigrations")
             if success:
                 print_success("Migrations created successfully")
                 if stdout:
                     migration_lines = [line for line in stdout.split('\n') if 'Migrations' in line or '.py' in line]
                     for line in migration_lines[:5]:
                         if line.strip() and 'Creating' in line:
-                            print(f"  {Colors.GREEN}{line.strip()}{Colors.NC}")
+                            emit(f"  {Colors.GREEN}{line.strip()}{Colors.NC}")
             else:
                 print_error("Failed to create migrations")
-                print(f"{Colors.RED}Error: {stderr}{Colors.NC}")
-                print(f"{Colors.YELLOW}⚠ Continuing anyway...{Colors.NC}")
+                emit(f"{Colors.RED}Error: {stderr}{Colors.NC}")
+                emit(f"{Colors.YELLOW}⚠ Continuing anyway...{Colors.NC}")
         else:
             print_success("No model changes detected")
     else:
         print_success("No new migrations needed")
-    
-    # Step 6: Check database connection
-    print_step(6, 10, "Checking database connection")
-    success, stdout, stderr = run_command(f"{venv_python} manage.py check --database default", check=False)
+
+# Step 6: Check database connection
+def step_check_database(ctx):
+    success, stdout, stderr = manage(ctx, "check", "--database", "default", check=False)
     if success:
         print_success("Database connection verified")
     else:
-        print(f"{Colors.YELLOW}⚠ Database check had issues, but continuing...{Colors.NC}")
+        emit(f"{Colors.YELLOW}⚠ Database check had issues, but continuing...{Colors.NC}")
         if stderr:
-            print(f"{Colors.YELLOW}  {stderr[:200]}{Colors.NC}")
-    
-    # Step 7: Run migrations (Update database)
-    print_step(7, 10, "Running database migrations")
-    
+            emit(f"{Colors.YELLOW}  {stderr[:200]}{Colors.NC}")
+
+# Step 7: Run migrations (Update database)
+def step_migrate(ctx):
     # Check for pending migrations first
     print_info("Checking for pending migrations...")
-    success, stdout, stderr = run_command(f"{venv_python} manage.py showmigrations --plan", check=False)
-    if success:
-        pending = [line for line in stdout.split('\n') if '[ ]' in line]
+    state = migration_state(ctx)
+    if state is not None:
+        pending = state['pending']
         if pending:
             print_info(f"Found {len(pending)} pending migration(s)")
-            for line in pending[:10]:  # Show first 10 pending migrations
-                if line.strip():
-                    print(f"  {Colors.YELLOW}{line.strip()}{Colors.NC}")
+            for name in pending[:10]:  # Show first 10 pending migrations
+                emit(f"  {Colors.YELLOW}[ ]  {name}{Colors.NC}")
         else:
             print_success("No pending migrations")
-    
+
     # Ask user if they want to run migrations
-    print(f"\n{Colors.BLUE}Database Migration Options:{Colors.NC}")
-    print("  1. Apply all pending migrations (recommended)")
-    print("  2. Skip migrations")
-    response = input(f"{Colors.BLUE}Choose option (1/2) [default: 1]: {Colors.NC}").strip()
-    
+    emit(f"\n{Colors.BLUE}Database Migration Options:{Colors.NC}")
+    emit("  1. Apply all pending migrations (recommended)")
+    emit("  2. Skip migrations")
+    response = ask(f"{Colors.BLUE}Choose option (1/2) [default: 1]: {Colors.NC}", ctx.answers.get('migrate')).strip()
+
     if response == '' or response == '1':
         print_info("Applying migrations...")
-        success, stdout, stderr = run_command(f"{venv_python} manage.py migrate --noinput")
+        with concurrency_slot('migrate'):
+            # no time limit: killing a schema migration part-way can leave the
+            # database half-migrated (MySQL DDL isn't transactional)
+            success, stdout, stderr = manage(ctx, "migrate", "--noinput", timeout=None)
         if success:
             print_success("Migrations completed successfully")
             # Show migration output
@@ -351,57 +1310,96 @@ if ON_PYTHONANYWHERE:
                 migration_lines = [line for line in stdout.split('\n') if 'Applying' in line or 'OK' in line]
                 for line in migration_lines[:15]:  # Show first 15 migration lines
                     if line.strip():
-                        print(f"  {Colors.GREEN}{line.strip()}{Colors.NC}")
+                        emit(f"  {Colors.GREEN}{line.strip()}{Colors.NC}")
         else:
             print_error("Migrations failed")
             if stderr:
-                print(f"{Colors.RED}Error details: {stderr[:500]}{Colors.NC}")
-            print(f"{Colors.YELLOW}You may need to check your database configuration{Colors.NC}")
-            response_continue = input(f"{Colors.YELLOW}Continue anyway? (y/n): {Colors.NC}")
+                emit(f"{Colors.RED}Error details: {stderr[:500]}{Colors.NC}")
+            emit(f"{Colors.YELLOW}You may need to check your database configuration{Colors.NC}")
+            response_continue = ask(f"{Colors.YELLOW}Continue anyway? (y/n): {Colors.NC}",
+                                    ctx.answers.get('continue_migrate'))
             if response_continue.lower() not in ['y', 'yes']:
-                sys.exit(1)
+                raise StepFailed()
     else:
-        print(f"{Colors.YELLOW}⚠ Skipped migrations{Colors.NC}")
-    
-    # Step 8: Verify database state
-    print_step(8, 10, "Verifying database state")
-    success, stdout, stderr = run_command(f"{venv_python} manage.py showmigrations", check=False)
-    if success:
-        unapplied = [line for line in stdout.split('\n') if '[ ]' in line]
-        applied = [line for line in stdout.split('\n') if '[X]' in line]
+        emit(f"{Colors.YELLOW}⚠ Skipped migrations{Colors.NC}")
+        return 'skipped'
+
+# Step 8: Verify database state
+def step_verify_database(ctx):
+    state = migration_state(ctx)
+    if state is not None:
+        unapplied = state['pending']
+        applied = state['applied']
         print_info(f"Applied migrations: {len(applied)}")
         if unapplied:
-            print(f"{Colors.YELLOW}Unapplied migrations: {len(unapplied)}{Colors.NC}")
+            emit(f"{Colors.YELLOW}Unapplied migrations: {len(unapplied)}{Colors.NC}")
         else:
             print_success("All migrations applied")
-    
-    # Step 9: Collect static files
-    print_step(9, 10, "Collecting static files")
-    success, _, _ = run_command(f"{venv_python} manage.py collectstatic --noinput")
+
+# Step 9: Collect static files
+def forget_static_manifest(ctx):
+    """Remove the manifests collect_static_incremental() left in STATIC_ROOT.
+
+    The performance settings only switch to ManifestStaticFilesStorage while
+    our manifest exists, so after a plain collectstatic this keeps them from
+    serving hashed names that are out of date.
+    """
+    success, stdout, _ = manage(ctx, "diffsettings", "--all", check=False)
+    match = re.search(r"^STATIC_ROOT = \w*\(?'([^']+)'", stdout or '', re.MULTILINE) if success else None
+    if not match:
+        return
+    static_root = Path(match.group(1))
+    if (static_root / STATIC_MANIFEST).exists():
+        for name in (STATIC_MANIFEST, "staticfiles.json"):
+            try:
+                (static_root / name).unlink()
+            except FileNotFoundError:
+                pass
+
+def step_collect_static(ctx):
+    helper = django_helper(ctx)
+    layout = helper.static_files(timeout=MANAGE_TIMEOUT) if helper else None
+    if layout is not None:
+        stats = collect_static_incremental(layout['files'], Path(layout['root']))
+        print_success(f"Static files collected: {stats['scanned']} scanned, {stats['copied']} copied, "
+                      f"{stats['skipped']} unchanged, {stats['removed']} removed, "
+                      f"{stats['bytes'] / 1024 / 1024:.1f} MB written")
+        return
+
+    success, _, _ = manage(ctx, "collectstatic", "--noinput")
     if success:
+        forget_static_manifest(ctx)
         print_success("Static files collected")
     else:
         print_error("Failed to collect static files")
-        print(f"{Colors.YELLOW}⚠ Continuing anyway...{Colors.NC}")
-    
-    # Step 10: Create superuser (optional)
-    print_step(10, 10, "Superuser creation")
-    response = input(f"{Colors.BLUE}Do you want to create a superuser? (y/n): {Colors.NC}")
-    if response.lower() in ['y', 'yes']:
-        run_command(f"{venv_python} manage.py createsuperuser", check=False)
+        emit(f"{Colors.YELLOW}⚠ Continuing anyway...{Colors.NC}")
+
+# Step 10: Create superuser (optional)
+def step_create_superuser(ctx):
+    response = ask(f"{Colors.BLUE}Do you want to create a superuser? (y/n): {Colors.NC}", ctx.answers.get('superuser'))
+    if response.lower() in ['y', 'yes'] and ctx.answers:
+        # unattended: Django reads DJANGO_SUPERUSER_USERNAME/_EMAIL/_PASSWORD
+        success, _, stderr = manage(ctx, "createsuperuser", "--noinput", check=False)
+        if success:
+            print_success("Superuser created")
+        else:
+            emit(f"{Colors.YELLOW}⚠ Superuser not created: {stderr.strip().splitlines()[-1] if stderr.strip() else 'unknown error'}{Colors.NC}")
+    elif response.lower() in ['y', 'yes']:
+        # interactive: holds the console so other steps' output can't interleave
+        with _console_lock:
+            run_command(f"{ctx.venv_python} manage.py createsuperuser", check=False, interactive=True)
         print_success("Superuser creation completed")
     else:
-        print(f"{Colors.YELLOW}⚠ Skipped superuser creation{Colors.NC}")
-    
-    # Generate WSGI config
-    print(f"\n{Colors.YELLOW}Generating WSGI configuration...{Colors.NC}")
-    wsgi_file = PROJECT_PATH / "wsgi_config_generated.py"
-    
-    # Determine settings module path
-    settings_module = "backend.settings"
-    if (PROJECT_PATH / PROJECT_NAME / "settings.py").exists():
-        settings_module = f"{PROJECT_NAME}.settings"
-    
+        emit(f"{Colors.YELLOW}⚠ Skipped superuser creation{Colors.NC}")
+        return 'skipped'
+
+# Generate WSGI config
+def step_generate_wsgi(ctx):
+    PROJECT_PATH = ctx.project_path
+    wsgi_file = ctx.wsgi_file
+
+    settings_module = settings_module_for(ctx)
+
     wsgi_content = f"""# Auto-generated WSGI configuration for PythonAnywhere
 # Copy this content to your WSGI file in the Web tab
 
@@ -417,16 +1415,493 @@ os.environ['DJANGO_SETTINGS_MODULE'] = '{settings_module}'
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 """
-    
+
     with open(wsgi_file, 'w', encoding='utf-8') as f:
         f.write(wsgi_content)
     print_success(f"WSGI configuration generated: {wsgi_file.name}")
-    
+
+# Resized WebP/JPEG copies of media images; originals are never modified
+MEDIA_VARIANTS_DIR = "_variants"  # inside media/, so served under /media/_variants/
+MEDIA_WIDTHS = (320, 640, 1280)
+MEDIA_WEBP_QUALITY = 80
+MEDIA_JPEG_QUALITY = 82
+MEDIA_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+MEDIA_WORKERS = os.cpu_count() or 2
+
+def optimize_image(source, target_base, widths):
+    """Write ``<target_base>.<width>w.webp`` and ``.jpg`` for each width.
+
+    Runs in a worker process. Images are never upscaled: widths at or above
+    the original are replaced by one variant at the original width.
+    Transparent images get a white background in the JPEG.
+    """
+    from PIL import Image, ImageOps, features
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+        width, height = image.size
+        sizes = [w for w in widths if w < width]
+        if width < max(widths):
+            sizes.append(width)
+        os.makedirs(os.path.dirname(target_base), exist_ok=True)
+        variants = []
+        for size in sizes:
+            resized = image if size == width else image.resize((size, max(1, round(height * size / width))), Image.LANCZOS)
+            if features.check('webp'):
+                path = f"{target_base}.{size}w.webp"
+                resized.save(path, 'WEBP', quality=MEDIA_WEBP_QUALITY, method=4)
+                variants.append({'width': size, 'format': 'webp', 'path': path, 'bytes': os.path.getsize(path)})
+            path = f"{target_base}.{size}w.jpg"
+            if resized.mode == 'RGBA':
+                flat = Image.new('RGB', resized.size, 'white')
+                flat.paste(resized, mask=resized.getchannel('A'))
+            else:
+                flat = resized
+            flat.save(path, 'JPEG', quality=MEDIA_JPEG_QUALITY, optimize=True, progressive=True)
+            variants.append({'width': size, 'format': 'jpg', 'path': path, 'bytes': os.path.getsize(path)})
+    return {'width': width, 'height': height, 'variants': variants}
+
+def step_optimize_media(ctx):
+    media_root = ctx.project_path / "media"
+    if not media_root.is_dir():
+        print_info("No media/ directory, nothing to optimize")
+        return 'skipped'
+    try:
+        import PIL  # noqa: F401  (used by optimize_image in the worker processes)
+    except ImportError:
+        print_info(f"Pillow isn't installed for {sys.executable}; skipping media optimization")
+        return 'skipped'
+
+    variants_root = media_root / MEDIA_VARIANTS_DIR
+    manifest_path = variants_root / "manifest.json"
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    sources = {}
+    for path in media_root.rglob('*'):
+        if path.is_file() and path.suffix.lower() in MEDIA_IMAGE_EXTENSIONS and variants_root not in path.parents:
+            sources[path.relative_to(media_root).as_posix()] = path
+    with ThreadPoolExecutor(max_workers=STATIC_WORKERS) as pool:
+        digests = dict(zip(sources, pool.map(file_sha256, sources.values())))
+
+    manifest = {}
+    changed = []
+    for name, digest in digests.items():
+        old = previous.get(name)
+        # variants are named after the whole source name ('poster.jpg.640w.webp'),
+        # so poster.jpg and poster.png can't overwrite each other's
+        prefix = f"{MEDIA_VARIANTS_DIR}/{name}."
+        if (old and old.get('sha256') == digest
+                and all(v['path'].startswith(prefix) and (media_root / v['path']).exists()
+                        for v in old.get('variants', []))):
+            manifest[name] = old
+        else:
+            changed.append(name)
+
+    failed = 0
+    if changed:
+        with ProcessPoolExecutor(max_workers=MEDIA_WORKERS) as pool:
+            futures = {
+                pool.submit(optimize_image, str(sources[name]),
+                            str(variants_root / name), MEDIA_WIDTHS): name
+                for name in changed
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    emit(f"{Colors.YELLOW}⚠ Could not optimize {name}: {e}{Colors.NC}")
+                    # recorded so an unchanged broken file isn't retried every deploy
+                    manifest[name] = {'sha256': digests[name], 'error': str(e), 'variants': []}
+                    failed += 1
+                    continue
+                for variant in result['variants']:
+                    variant['path'] = Path(variant['path']).relative_to(media_root).as_posix()
+                manifest[name] = dict(result, sha256=digests[name], bytes=sources[name].stat().st_size)
+
+    # variants of originals that were deleted or changed
+    removed = 0
+    for name, old in previous.items():
+        current = {v['path'] for v in manifest.get(name, {}).get('variants', [])}
+        for variant in old.get('variants', []):
+            if variant['path'] not in current:
+                try:
+                    (media_root / variant['path']).unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+
+    variants_root.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    original_bytes = sum(entry.get('bytes', 0) for entry in manifest.values() if entry['variants'])
+    # what a full-width <picture> would send: the widest variant, WebP when there is one
+    largest_bytes = sum(max(entry['variants'], key=lambda v: (v['width'], v['format'] == 'webp'))['bytes']
+                        for entry in manifest.values() if entry['variants'])
+    print_success(f"Media optimized: {len(sources)} images, {len(changed) - failed} processed, "
+                  f"{len(sources) - len(changed)} unchanged, {failed} failed, {removed} old variants removed")
+    if original_bytes:
+        print_info(f"Largest variants are {largest_bytes / 1024 / 1024:.1f} MB vs "
+                   f"{original_bytes / 1024 / 1024:.1f} MB of originals ({MEDIA_VARIANTS_DIR}/manifest.json lists them)")
+
+# Runs in the venv: compiles the project (argv[1]) and site-packages to
+# checked-hash pycs, skipping files whose pyc already matches the source hash.
+PRECOMPILE_SOURCE = r'''
+import os, sys, json, sysconfig, py_compile, importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+SKIP_DIRS = {'__pycache__', '.git', 'node_modules', 'staticfiles', 'media'}
+CHECKED_HASH = 0b11  # pyc flags: hash-based, check source
+
+def up_to_date(path):
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        with open(importlib.util.cache_from_source(path), 'rb') as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    return (header[:4] == importlib.util.MAGIC_NUMBER
+            and int.from_bytes(header[4:8], 'little') == CHECKED_HASH
+            and header[8:16] == importlib.util.source_hash(source))
+
+def compile_one(path):
+    if up_to_date(path):
+        return 'skipped'
+    try:
+        py_compile.compile(path, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        return 'compiled'
+    except (py_compile.PyCompileError, OSError, ValueError):
+        return 'failed'  # e.g. files for another Python version shipped in a package
+
+def sources(root, exclude):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and os.path.join(dirpath, d) not in exclude]
+        for name in filenames:
+            if name.endswith('.py'):
+                yield os.path.join(dirpath, name)
+
+if __name__ == '__main__':
+    project = os.path.abspath(sys.argv[1])
+    paths = sysconfig.get_paths()
+    site_dirs = sorted({paths['purelib'], paths['platlib']})
+    files = list(sources(project, {sys.prefix} | set(site_dirs)))
+    for site_dir in site_dirs:
+        files.extend(sources(site_dir, set()))
+    counts = {'files': len(files), 'compiled': 0, 'skipped': 0, 'failed': 0}
+    with ProcessPoolExecutor() as pool:
+        for status in pool.map(compile_one, files, chunksize=64):
+            counts[status] += 1
+    print(json.dumps(counts))
+'''
+
+def step_precompile(ctx):
+    started = time.perf_counter()
+    success, stdout, _ = run_command([str(ctx.venv_python), '-c', PRECOMPILE_SOURCE, str(ctx.project_path)],
+                                     shell=False, timeout=MANAGE_TIMEOUT, label="precompile bytecode")
+    if not success:
+        emit(f"{Colors.YELLOW}⚠ Bytecode precompilation failed, workers will compile on first import{Colors.NC}")
+        return 'skipped'
+    counts = json.loads(stdout.strip().splitlines()[-1])
+    print_success(f"Bytecode ready: {counts['files']} files, {counts['compiled']} compiled, "
+                  f"{counts['skipped']} unchanged, {counts['failed']} not compilable "
+                  f"({time.perf_counter() - started:.1f}s)")
+
+    # Load the generated WSGI file the way a worker does after Reload
+    load = ("import runpy, sys, time; started = time.perf_counter(); "
+            f"runpy.run_path({str(ctx.wsgi_file)!r}); "
+            "print('%.3f %d' % (time.perf_counter() - started, len(sys.modules)))")
+    success, stdout, stderr = run_command([str(ctx.venv_python), '-c', load], shell=False, check=False,
+                                          timeout=MANAGE_TIMEOUT, label="load WSGI application")
+    if success:
+        # the project may print while it loads; the timing is the last line
+        try:
+            seconds, modules = stdout.strip().splitlines()[-1].split()
+            print_info(f"WSGI application (settings {settings_module_for(ctx)}) loads in {float(seconds):.2f}s, "
+                       f"{modules} modules imported")
+        except (IndexError, ValueError):
+            emit(f"{Colors.YELLOW}⚠ Couldn't read the load time of {ctx.wsgi_file.name} from its output{Colors.NC}")
+    else:
+        emit(f"{Colors.YELLOW}⚠ Loading {ctx.wsgi_file.name} failed:{Colors.NC}")
+        for line in stderr.strip().splitlines()[-5:]:
+            emit(f"    {line}")
+
+# Post-deploy warmup: the read endpoints the frontend uses
+BENCH_PATHS = [
+    '/api/events/?upcoming=true',
+    '/api/completed-events/',
+    '/api/event-results/',
+    '/api/completed-events/<id>/',  # <id> is taken from the list endpoint
+]
+BENCH_REQUESTS = 20            # warm requests per endpoint after the cold one
+BENCH_BASELINE_FILE = ".deploy_benchmark.json"
+BENCH_WARN_RATIO = 1.25        # p95 this much above the last deploy: warning
+BENCH_FAIL_RATIO = 2.0         # p50 this much above: the step fails (p95 of a few
+                               # requests is too noisy on a busy host to fail on)
+BENCH_MIN_DELTA_MS = 5.0       # smaller changes are noise
+
+def step_benchmark(ctx):
+    helper = django_helper(ctx)
+    if helper is None:
+        print_info("Skipping API warmup (needs the Django helper)")
+        return 'skipped'
+    results = helper.benchmark(BENCH_PATHS, BENCH_REQUESTS, timeout=MANAGE_TIMEOUT)
+    if results is None:
+        emit(f"{Colors.YELLOW}⚠ API warmup failed, continuing anyway{Colors.NC}")
+        for line in list(helper.stderr_tail)[-5:]:
+            emit(f"    {line}")
+        return 'skipped'
+
+    baseline_file = ctx.project_path / BENCH_BASELINE_FILE
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    failed = False
+    for path, result in results.items():
+        if 'skipped' in result:
+            emit(f"  {path:<32} skipped: {result['skipped']}")
+            continue
+        line = (f"  {path:<32} {result['status']}  first {result['first_ms']:6.1f}ms  "
+                f"p50 {result['p50_ms']:6.1f}ms  p95 {result['p95_ms']:6.1f}ms  {result['queries']} queries")
+        old = baseline.get(path)
+        if result['status'] >= 400:
+            emit(f"{Colors.YELLOW}{line}  (HTTP {result['status']}){Colors.NC}")
+            continue
+        if not old:
+            emit(line)
+            continue
+        p50_ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1.0
+        p95_ratio = result['p95_ms'] / old['p95_ms'] if old['p95_ms'] else 1.0
+        line += f"  (p50/p95 was {old['p50_ms']:.1f}/{old['p95_ms']:.1f}ms, {old['queries']} queries)"
+        if result['p50_ms'] - old['p50_ms'] >= BENCH_MIN_DELTA_MS and p50_ratio >= BENCH_FAIL_RATIO:
+            emit(f"{Colors.RED}{line}  ✗ {p50_ratio:.1f}x slower{Colors.NC}")
+            failed = True
+        elif ((result['p95_ms'] - old['p95_ms'] >= BENCH_MIN_DELTA_MS and p95_ratio >= BENCH_WARN_RATIO)
+              or result['queries'] > old['queries']):
+            emit(f"{Colors.YELLOW}{line}  ⚠ regression{Colors.NC}")
+        else:
+            emit(line)
+
+    if failed:
+        print_error(f"API latency regressed more than {BENCH_FAIL_RATIO:.0f}x; baseline left at the previous deploy")
+        raise StepFailed()
+    with open(baseline_file, 'w', encoding='utf-8') as f:
+        json.dump({path: r for path, r in results.items() if 'skipped' not in r and r['status'] < 400}, f, indent=2)
+    print_success(f"API warmed up; baseline saved to {baseline_file.name}")
+
+def deploy_steps():
+    """The deploy as a dependency graph.
+
+    settings.py is only touched once the dependencies installed, so a failed
+    install leaves the project as it was. After that, check, collectstatic
+    and the WSGI file overlap with makemigrations and migrate. The API warmup
+    runs once the database and static files are in place.
+    """
+    return [
+        Step('project', 1, "Checking project directory", step_check_project),
+        Step('venv', 2, "Setting up virtual environment", step_venv, deps=['project']),
+        Step('dependencies', 3, "Installing dependencies", step_install_dependencies, deps=['venv']),
+        Step('settings', 4, "Updating settings.py for production", step_update_settings, deps=['dependencies']),
+        Step('makemigrations', 5, "Creating migrations for model changes", step_make_migrations,
+             deps=['dependencies', 'settings']),
+        Step('check_database', 6, "Checking database connection", step_check_database,
+             deps=['dependencies', 'settings']),
+        Step('migrate', 7, "Running database migrations", step_migrate, deps=['makemigrations']),
+        Step('verify_database', 8, "Verifying database state", step_verify_database, deps=['migrate']),
+        Step('collectstatic', 9, "Collecting static files", step_collect_static, deps=['dependencies', 'settings']),
+        Step('superuser', 10, "Superuser creation", step_create_superuser, deps=['migrate']),
+        Step('wsgi', None, "Generating WSGI configuration", step_generate_wsgi, deps=['settings']),
+        Step('precompile', None, "Precompiling bytecode", step_precompile,
+             deps=['dependencies', 'settings', 'makemigrations', 'wsgi']),
+        Step('media', None, "Optimizing media images", step_optimize_media, deps=['project']),
+        Step('benchmark', None, "Warming up the API and checking latency", step_benchmark,
+             deps=['migrate', 'collectstatic']),
+    ]
+
+def run_deploy(ctx):
+    """Run every step for ``ctx``, print the timings and save the profile."""
+    steps = deploy_steps()
+    previous_profile = load_profile(ctx.project_path)
+    started = time.perf_counter()
+    try:
+        results = run_steps(steps, ctx)
+    finally:
+        ctx.close()
+    wall_seconds = time.perf_counter() - started
+    print_timings(steps, results, wall_seconds, previous_profile)
+    if ctx.project_path.is_dir():
+        save_profile(ctx.project_path, steps, results, wall_seconds)
+        print_info(f"Deploy profile saved to {ctx.project_path / PROFILE_FILE}")
+    return results
+
+# Example --config file (JSON); everything but "projects" and "path" is optional:
+# {
+#   "python_version": "3.10", "username": "BackendBadminton", "settings_profile": "performance",
+#   "max_parallel": 2, "pip_slots": 1, "migrate_slots": 1, "log_dir": "deploy_logs",
+#   "projects": [
+#     {"path": "~/season2024"},
+#     {"path": "~/season2025", "name": "s25", "migrate": false, "create_superuser": true}
+#   ]
+# }
+# Any project-level key overrides the top-level one. create_superuser needs
+# DJANGO_SUPERUSER_USERNAME, DJANGO_SUPERUSER_EMAIL and DJANGO_SUPERUSER_PASSWORD.
+
+def init_worker(slots):
+    _slots.update(slots)
+
+def deploy_project(spec, log_path):
+    """Deploy one project from a --config file in a worker process, output to ``log_path``."""
+    started = time.perf_counter()
+    path = Path(spec['path']).expanduser().resolve()
+    name = spec.get('name') or path.name
+    with open(log_path, 'w', encoding='utf-8', buffering=1) as log:
+        # children inherit fds 1 and 2, so their output lands in the log too
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        sys.stdout = sys.stderr = log
+        for color in ('GREEN', 'YELLOW', 'RED', 'BLUE', 'NC'):
+            setattr(Colors, color, '')
+        try:
+            if path.is_dir():
+                os.chdir(path)
+            ctx = DeployContext(name, spec.get('python_version', '3.10'), spec.get('username') or getpass.getuser(),
+                                path, spec.get('settings_profile', 'performance'))
+            ctx.answers = {
+                'migrate': '1' if spec.get('migrate', True) else '2',
+                'continue_migrate': 'y' if spec.get('continue_on_migrate_failure', False) else 'n',
+                'superuser': 'y' if spec.get('create_superuser', False) else 'n',
+            }
+            results = run_deploy(ctx)
+            failed = [key for key, result in results.items() if result.status == 'failed']
+            not_run = sum(1 for result in results.values() if result.status == 'not run')
+            status = 'failed' if failed or not_run else 'ok'
+        except Exception:
+            traceback.print_exc()
+            failed, not_run, status = [], 0, 'error'
+    return {'name': name, 'path': str(path), 'status': status, 'failed_steps': failed, 'not_run': not_run,
+            'seconds': time.perf_counter() - started, 'log': str(log_path)}
+
+def deploy_many(config_path):
+    """Deploy every project in a JSON config file, unattended and concurrently."""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    defaults = {key: value for key, value in config.items() if key != 'projects'}
+    specs = [dict(defaults, **project) for project in config['projects']]
+    log_dir = Path(config.get('log_dir', 'deploy_logs')).expanduser()
+    log_dir.mkdir(parents=True, exist_ok=True)
+    slots = {kind: multiprocessing.BoundedSemaphore(config.get(f'{kind}_slots', 1)) for kind in ('pip', 'migrate')}
+
+    print(f"{Colors.YELLOW}Deploying {len(specs)} projects, {config.get('max_parallel', 2)} at a time "
+          f"(logs in {log_dir}){Colors.NC}")
+    started = time.perf_counter()
+    outcomes = []
+    with ProcessPoolExecutor(max_workers=config.get('max_parallel', 2), initializer=init_worker,
+                             initargs=(slots,)) as pool:
+        futures = {}
+        for index, spec in enumerate(specs):
+            name = spec.get('name') or Path(spec['path']).expanduser().name
+            futures[pool.submit(deploy_project, spec, log_dir / f"{index + 1:02d}_{name}.log")] = (spec, name)
+        for future in as_completed(futures):
+            spec, name = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:  # the worker process itself died
+                outcome = {'name': name, 'path': spec['path'], 'status': 'error', 'failed_steps': [],
+                           'not_run': 0, 'seconds': 0.0, 'log': str(e)}
+            outcomes.append(outcome)
+            mark = f"{Colors.GREEN}✓" if outcome['status'] == 'ok' else f"{Colors.RED}✗"
+            print(f"{mark} {outcome['name']}: {outcome['status']} in {outcome['seconds']:.1f}s{Colors.NC}")
+
+    print(f"\n{Colors.YELLOW}Deploy summary ({time.perf_counter() - started:.1f}s wall clock):{Colors.NC}")
+    print(f"  {'Project':<20} {'Result':<8} {'Time':>8}  {'Failed steps':<24} Log")
+    for outcome in sorted(outcomes, key=lambda o: o['name']):
+        failed = ', '.join(outcome['failed_steps']) or '-'
+        if outcome['not_run']:
+            failed += f" (+{outcome['not_run']} not run)"
+        print(f"  {outcome['name']:<20} {outcome['status']:<8} {outcome['seconds']:7.1f}s  "
+              f"{failed:<24} {outcome['log']}")
+    if any(outcome['status'] != 'ok' for outcome in outcomes):
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Deploy a Django project on PythonAnywhere.")
+    parser.add_argument('--config', help="JSON file listing projects to deploy unattended and in parallel")
+    args = parser.parse_args()
+    if args.config:
+        deploy_many(args.config)
+        return
+
+    print(f"{Colors.BLUE}{'='*50}{Colors.NC}")
+    print(f"{Colors.BLUE}  Automated Django Deployment Script{Colors.NC}")
+    print(f"{Colors.BLUE}  (Database & Model Updates Included){Colors.NC}")
+    print(f"{Colors.BLUE}{'='*50}{Colors.NC}\n")
+
+    # Configuration
+    # ============================================
+    # Your specific configuration:
+    # ============================================
+    PROJECT_NAME = "myproject"  # Your project folder name
+    PYTHON_VERSION = "3.10"      # Python version (3.9, 3.10, 3.11, etc.)
+    SETTINGS_PROFILE = "performance"  # "performance" or "basic" (DEBUG, hosts, CORS and logging only)
+
+    # Auto-detect username, or set manually if needed:
+    # For user: BackendBadminton
+    detected_username = getpass.getuser()
+    USERNAME = detected_username  # Will auto-detect as "BackendBadminton" on PythonAnywhere
+
+    # Auto-detect project path - check current directory first, then home directory
+    current_dir = Path.cwd()
+    home_dir = Path.home()
+
+    # Check if we're already in the project directory (has manage.py)
+    if (current_dir / "manage.py").exists():
+        PROJECT_PATH = current_dir
+        print(f"{Colors.YELLOW}✓ Detected project in current directory: {PROJECT_PATH}{Colors.NC}")
+    # Check if project is in a subdirectory (e.g., ~/myproject/myproject/)
+    elif (current_dir / PROJECT_NAME / "manage.py").exists():
+        PROJECT_PATH = current_dir / PROJECT_NAME
+        print(f"{Colors.YELLOW}✓ Detected project in subdirectory: {PROJECT_PATH}{Colors.NC}")
+    # Check nested structure: ~/myproject/myproject/ (Git repo root with nested project)
+    elif (current_dir.parent / PROJECT_NAME / "manage.py").exists() and current_dir.name == PROJECT_NAME:
+        PROJECT_PATH = current_dir
+        print(f"{Colors.YELLOW}✓ Detected nested project structure: {PROJECT_PATH}{Colors.NC}")
+    # Check home directory
+    elif (home_dir / PROJECT_NAME / "manage.py").exists():
+        PROJECT_PATH = home_dir / PROJECT_NAME
+        print(f"{Colors.YELLOW}✓ Detected project in home directory: {PROJECT_PATH}{Colors.NC}")
+    else:
+        PROJECT_PATH = home_dir / PROJECT_NAME
+        print(f"{Colors.YELLOW}⚠ Using default path: {PROJECT_PATH}{Colors.NC}")
+        print(f"{Colors.YELLOW}  Current directory: {current_dir}{Colors.NC}")
+
+    print(f"{Colors.YELLOW}Configuration:{Colors.NC}")
+    print(f"  Project: {PROJECT_NAME}")
+    print(f"  Username: {USERNAME}")
+    print(f"  Python: {PYTHON_VERSION}")
+    print(f"  Settings profile: {SETTINGS_PROFILE}")
+    print(f"  Path: {PROJECT_PATH}\n")
+
+    ctx = DeployContext(PROJECT_NAME, PYTHON_VERSION, USERNAME, PROJECT_PATH, SETTINGS_PROFILE)
+    results = run_deploy(ctx)
+    if any(result.status in ('failed', 'not run') for result in results.values()):
+        print_error("Deployment stopped")
+        sys.exit(1)
+    wsgi_file = ctx.wsgi_file
+
     # Summary
     print(f"\n{Colors.GREEN}{'='*50}{Colors.NC}")
     print(f"{Colors.GREEN}  Deployment Setup Complete!{Colors.NC}")
     print(f"{Colors.GREEN}{'='*50}{Colors.NC}\n")
-    
+
     print(f"{Colors.YELLOW}What was done:{Colors.NC}")
     print("✓ Virtual environment setup")
     print("✓ Dependencies installed")
@@ -435,7 +1910,7 @@ application = get_wsgi_application()
     print("✓ Database migrations applied")
     print("✓ Static files collected")
     print("✓ WSGI configuration generated\n")
-    
+
     print(f"{Colors.YELLOW}Next steps (Manual):{Colors.NC}")
     print("1. Go to Web tab in PythonAnywhere dashboard")
     print("2. Click 'Add a new web app' (if not created)")
@@ -449,10 +1924,10 @@ application = get_wsgi_application()
     print(f"   - URL: /media/")
     print(f"   - Directory: {PROJECT_PATH}/media")
     print("8. Click 'Reload' button\n")
-    
+
     print(f"{Colors.GREEN}Your API will be available at:{Colors.NC}")
     print(f"{Colors.BLUE}https://{USERNAME}.pythonanywhere.com{Colors.NC}\n")
-    
+
     print(f"{Colors.YELLOW}Database Status:{Colors.NC}")
     print(f"  - Models: Checked and migrations created if needed")
     print(f"  - Database: Migrations applied")
@@ -462,6 +1937,7 @@ if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
+        kill_running_commands()
         print(f"\n{Colors.YELLOW}Deployment cancelled by user{Colors.NC}")
         sys.exit(1)
     except Exception as e:
@@ -1,29 +1,230 @@
 """
 Fetch all tracks from a Spotify playlist and find top YouTube result for each track.
 Saves CSV: playlist_with_youtube.csv
+
+Tracks flow through a streaming pipeline (Spotify pages -> YouTube search ->
+CSV writer), so memory stays flat however long the playlist is. pandas is
+only needed for load_results_dataframe().
+
+spotipy and googleapiclient are imported on first use, and the YouTube
+discovery document is read from a local copy, so small scheduled runs start
+quickly. ``python d.py --startup-report`` prints where startup time goes.
 """
 
 import os
+import sys
 import csv
+import re
 import time
-import pandas as pd
-from googleapiclient.discovery import build
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import sqlite3
+import threading
+import subprocess
+import json
+import glob
+import hashlib
+import unicodedata
+from collections import deque
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
 # --------- USER CONFIG ---------
 SPOTIFY_CLIENT_ID = "YOUR_SPOTIFY_CLIENT_ID"
 SPOTIFY_CLIENT_SECRET = "YOUR_SPOTIFY_CLIENT_SECRET"
 SPOTIFY_REDIRECT_URI = "http://localhost:8888/callback"  # must match app settings
 PLAYLIST_ID = "YOUR_PLAYLIST_ID"  # e.g. "37i9..." from the spotify playlist url
+# Batch mode: list several playlists here (or pass their IDs on the command
+# line). Songs shared between playlists are only searched once.
+PLAYLIST_IDS = []
+BATCH_OUTPUT_DIR = "playlists"   # one <playlist_id>.csv per playlist
+SPOTIFY_PAGE_SIZE = 100  # playlist_items maximum
+SPOTIFY_PAGE_WORKERS = 4 # concurrent page requests (1 = follow `next` links serially)
 YOUTUBE_API_KEY = "YOUR_YOUTUBE_API_KEY"
+DISCOVERY_CACHE_PATH = "youtube_v3_discovery.json"  # local copy of the API discovery document
+YOUTUBE_API_ENDPOINT = None  # override the API base URL, e.g. the fake server in d_bench.py
 OUTPUT_CSV = "playlist_with_youtube.csv"
+OUTPUT_COLUMNS = ['track_name', 'artist', 'spotify_url', 'youtube_url']
+SHOW_DATAFRAME = False   # load the finished CSV into pandas and print its head
+# Output formats written next to OUTPUT_CSV (same base name): "csv",
+# "jsonl" (append-only change log), "sqlite" (upserted table) and
+# "parquet" (needs pyarrow).
+OUTPUT_FORMATS = ["csv"]
+PARQUET_ROW_GROUP = 10_000
+SEARCH_WORKERS = 8       # concurrent YouTube lookups (1 = serial)
+SEARCH_RATE = 10.0       # max search.list requests per second
+SEARCH_BURST = 5         # requests allowed back-to-back before the rate applies
+SEARCH_MAX_RETRIES = 5   # retries per track after a 429/403 rate-limit response
+SEARCH_CANDIDATES = 5    # results per search.list call, verified before picking one
+VIDEOS_LIST_BATCH = 50   # max IDs per videos.list call
+DURATION_TOLERANCE_S = 30  # candidates this far off the Spotify duration score 0 on length
+QUOTA_BUDGET = 10_000    # YouTube quota units this run may spend (None = unlimited)
+CACHE_PATH = "youtube_search_cache.sqlite3"  # set to None to disable the cache
+CACHE_TTL_DAYS = 30           # how long a found video stays valid
+CACHE_NEGATIVE_TTL_DAYS = 7   # "no results" expire sooner, uploads appear over time
+CACHE_MAX_ENTRIES = 200_000   # least recently used entries beyond this are evicted
+INCREMENTAL = True            # only search tracks added since the last run
+SYNC_STATE_PATH = "playlist_sync_state.sqlite3"
+MATCH_INDEX_PATH = "youtube_match_index.sqlite3"  # local index of earlier results (None to disable)
+MATCH_INDEX_SOURCES = [OUTPUT_CSV, os.path.join(BATCH_OUTPUT_DIR, "*.csv")]  # CSV globs the index learns from
+FUZZY_MATCH_THRESHOLD = 0.8  # trigram similarity needed to reuse a result for a different title
+METRICS_JSON = "d_metrics.json"   # per-run stage latencies and counters (None to disable)
+METRICS_PROM = "d_metrics.prom"   # same, in Prometheus textfile-collector format (None to disable)
+SHOW_PROGRESS = False             # redraw a throughput/ETA line on stderr while searching
 # -------------------------------
 
 # Scopes needed to read playlists (private playlists require playlist-read-private)
 SCOPE = "playlist-read-private playlist-read-collaborative"
 
+def ordered_map(fn, iterable, workers, window=None):
+    """Like ``ThreadPoolExecutor.map`` but lazy: at most ``window`` items are
+    in flight or waiting to be consumed, and results come back in input order.
+    """
+    window = window or workers * 4
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        in_flight = deque()
+        for item in iterable:
+            in_flight.append(pool.submit(fn, item))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+class Metrics:
+    """Thread-safe latency samples and counters for one run.
+
+    Stages are timed with ``with METRICS.timer('stage'):``; counters take an
+    optional stage label. report() turns the samples into p50/p95/p99.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.samples = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def incr(self, name, amount=1, stage=None):
+        with self.lock:
+            self.counters[(name, stage)] = self.counters.get((name, stage), 0) + amount
+
+    def count(self, name, stage=None):
+        with self.lock:
+            return self.counters.get((name, stage), 0)
+
+    def report(self):
+        def percentile(ordered, q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        with self.lock:
+            stages = {}
+            for stage, values in self.samples.items():
+                ordered = sorted(values)
+                stages[stage] = {
+                    'count': len(ordered),
+                    'sum': sum(ordered),
+                    'p50': percentile(ordered, 0.50),
+                    'p95': percentile(ordered, 0.95),
+                    'p99': percentile(ordered, 0.99),
+                    'max': ordered[-1],
+                }
+            counters = {f"{name}{{stage={stage}}}" if stage else name: value
+                        for (name, stage), value in sorted(self.counters.items(), key=str)}
+        hits, misses = counters.get('cache_hits_total', 0), counters.get('cache_misses_total', 0)
+        return {
+            'started': self.started,
+            'duration_seconds': time.time() - self.started,
+            'stages': stages,
+            'counters': counters,
+            'cache_hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+
+    def prometheus(self, prefix="playlist_sync"):
+        report = self.report()
+        lines = [f"# TYPE {prefix}_stage_latency_seconds summary"]
+        for stage, st in report['stages'].items():
+            for q in ('p50', 'p95', 'p99'):
+                quantile = int(q[1:]) / 100
+                lines.append(f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {st[q]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {st["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {st["count"]}')
+        with self.lock:
+            counters = sorted(self.counters.items(), key=str)
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for (counter, stage), value in counters:
+                if counter == name:
+                    labels = f'{{stage="{stage}"}}' if stage else ''
+                    lines.append(f"{prefix}_{name}{labels} {value}")
+        if report['cache_hit_rate'] is not None:
+            lines.append(f"# TYPE {prefix}_cache_hit_ratio gauge")
+            lines.append(f"{prefix}_cache_hit_ratio {report['cache_hit_rate']:.4f}")
+        lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+        lines.append(f"{prefix}_run_duration_seconds {report['duration_seconds']:.3f}")
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds {self.started + report['duration_seconds']:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=METRICS_JSON, prom_path=METRICS_PROM):
+        # written via rename so the textfile collector never reads half a file
+        for path, content in ((json_path, lambda: json.dumps(self.report(), indent=2)),
+                              (prom_path, self.prometheus)):
+            if not path:
+                continue
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                f.write(content())
+            os.replace(f"{path}.tmp", path)
+
+METRICS = Metrics()
+
+class ProgressLine:
+    """Redraws one stderr line with searched tracks, throughput and ETA."""
+
+    def __init__(self, total, interval=1.0):
+        self.total = total if isinstance(total, int) else None
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.done = METRICS.count('tracks_searched_total')
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.draw()
+        sys.stderr.write("\n")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.draw()
+
+    def draw(self):
+        done = METRICS.count('tracks_searched_total') - self.done
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed else 0.0
+        line = f"{done}/{self.total or '?'} tracks  {rate:.1f} tracks/s"
+        if self.total and rate:
+            remaining = (self.total - done) / rate
+            line += f"  ETA {int(remaining // 60)}:{int(remaining % 60):02d}"
+        sys.stderr.write(f"\r{line:<60}")
+        sys.stderr.flush()
+
 def get_spotify_client():
+    import spotipy
+    from spotipy.oauth2 import SpotifyOAuth
     sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
         client_id=SPOTIFY_CLIENT_ID,
         client_secret=SPOTIFY_CLIENT_SECRET,
@@ -33,11 +234,38 @@ def get_spotify_client():
     ))
     return sp
 
-def fetch_all_playlist_tracks(sp, playlist_id):
-    results = sp.playlist_items(playlist_id, fields="next,items(track(name,artists(name),external_urls,href,uri,external_ids))", additional_types=['track'])
-    tracks = []
-    while True:
-        for item in results['items']:
+PLAYLIST_ITEM_FIELDS = "items(track(name,artists(name),external_urls,href,uri,external_ids,duration_ms))"
+
+def iter_playlist_pages(sp, playlist_id, workers=SPOTIFY_PAGE_WORKERS, page_size=SPOTIFY_PAGE_SIZE):
+    """Yield playlist_items pages in playlist order.
+
+    The first page reports ``total``, so the remaining offsets are fetched
+    concurrently instead of walking ``next`` links one at a time. Pages are
+    yielded as soon as every page before them has arrived.
+    """
+    with METRICS.timer('spotify_page'):
+        first = sp.playlist_items(playlist_id, fields=f"total,next,{PLAYLIST_ITEM_FIELDS}",
+                                  additional_types=['track'], limit=page_size)
+    yield first
+    total = first.get('total')
+    if total is None or workers <= 1:
+        results = first
+        while results.get('next'):
+            with METRICS.timer('spotify_page'):
+                results = sp.next(results)
+            yield results
+        return
+
+    def fetch_page(offset):
+        with METRICS.timer('spotify_page'):
+            return sp.playlist_items(playlist_id, fields=PLAYLIST_ITEM_FIELDS,
+                                     additional_types=['track'], offset=offset, limit=page_size)
+
+    yield from ordered_map(fetch_page, range(page_size, total, page_size), workers)
+
+def iter_playlist_tracks(sp, playlist_id, workers=SPOTIFY_PAGE_WORKERS):
+    for page in iter_playlist_pages(sp, playlist_id, workers=workers):
+        for item in page['items']:
             track = item.get('track')
             if not track:
                 continue
@@ -45,69 +273,1088 @@ def fetch_all_playlist_tracks(sp, playlist_id):
             artists = [a['name'] for a in track.get('artists', [])]
             artist = artists[0] if artists else ''
             spotify_url = track.get('external_urls', {}).get('spotify', '')
-            tracks.append({
+            yield {
                 'track_name': name,
                 'artist': artist,
-                'spotify_url': spotify_url
-            })
-        if results.get('next'):
-            results = sp.next(results)
-        else:
-            break
-    return tracks
+                'spotify_url': spotify_url,
+                'uri': track.get('uri') or spotify_url,
+                'isrc': (track.get('external_ids') or {}).get('isrc') or '',
+                'duration_ms': track.get('duration_ms')
+            }
 
-def youtube_search_top(youtube, query):
+def fetch_all_playlist_tracks(sp, playlist_id, workers=SPOTIFY_PAGE_WORKERS):
+    return list(iter_playlist_tracks(sp, playlist_id, workers=workers))
+
+def track_key(track):
+    # The ISRC identifies the recording, so the same song released on a single
+    # and on an album (two different URIs) is still looked up only once.
+    if track.get('isrc'):
+        return f"isrc:{track['isrc'].upper()}"
+    return track['uri']
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+
+def youtube_discovery_document():
+    """Return the YouTube v3 discovery document as JSON text.
+
+    Read from DISCOVERY_CACHE_PATH when present; otherwise taken from the
+    copy bundled with googleapiclient (or downloaded once) and saved there.
+    """
+    global _discovery_doc
+    with _discovery_lock:
+        if _discovery_doc is None:
+            if DISCOVERY_CACHE_PATH and os.path.exists(DISCOVERY_CACHE_PATH):
+                with open(DISCOVERY_CACHE_PATH, encoding='utf-8') as f:
+                    _discovery_doc = f.read()
+            else:
+                try:
+                    from googleapiclient.discovery_cache import get_static_doc
+                    doc = get_static_doc("youtube", "v3")
+                except ImportError:
+                    doc = None
+                if doc is None:
+                    from urllib.request import urlopen
+                    with urlopen(DISCOVERY_URL, timeout=30) as res:
+                        doc = res.read().decode('utf-8')
+                if DISCOVERY_CACHE_PATH:
+                    with open(DISCOVERY_CACHE_PATH, 'w', encoding='utf-8') as f:
+                        f.write(doc)
+                _discovery_doc = doc
+        return _discovery_doc
+
+def build_youtube():
+    from googleapiclient.discovery import build_from_document
+    client_options = {'api_endpoint': YOUTUBE_API_ENDPOINT} if YOUTUBE_API_ENDPOINT else None
+    return build_from_document(youtube_discovery_document(), developerKey=YOUTUBE_API_KEY,
+                               client_options=client_options)
+
+# Suffixes and bracketed parts that mark a variant of the same song, e.g.
+# "Song - Remastered 2011", "Song (feat. X)", "Song [Radio Edit]", "Song - Live".
+VARIANT_WORDS = (r"remaster(?:ed)?|live|radio edit|single version|album version|mono|stereo|"
+                 r"edit|version|acoustic|demo|bonus track|deluxe|explicit|clean|"
+                 r"feat\.?|ft\.?|featuring|with")
+_VARIANT_BRACKETS = re.compile(rf"[(\[][^)\]]*\b(?:{VARIANT_WORDS})\b[^)\]]*[)\]]", re.IGNORECASE)
+_VARIANT_SUFFIX = re.compile(rf"\s+-\s+.*\b(?:{VARIANT_WORDS})\b.*$", re.IGNORECASE)
+_FEATURING = re.compile(r"\s+(?:feat\.?|ft\.?|featuring)\s+.*$", re.IGNORECASE)
+
+def fold(text):
+    """Casefold, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return ' '.join(re.findall(r"\w+", text))
+
+def normalize_title(title):
+    stripped = _VARIANT_BRACKETS.sub(' ', title or '')
+    stripped = _VARIANT_SUFFIX.sub('', stripped)
+    stripped = _FEATURING.sub('', stripped)
+    # a title that is nothing but "variant" words ("Live", "Intro (Remix)") stays as it is
+    return fold(stripped) or fold(title)
+
+def search_query(track):
+    return f"{normalize_title(track['track_name'])} {track['artist']}"
+
+def video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+# search.list costs 100 units whatever maxResults is; videos.list costs 1 unit
+# for up to 50 IDs, so verifying a handful of candidates is nearly free.
+SEARCH_LIST_COST = 100
+VIDEOS_LIST_COST = 1
+
+def youtube_search_candidates(youtube, query, max_results=SEARCH_CANDIDATES):
     # Search for videos only, order by relevance (default)
     req = youtube.search().list(
         q=query,
         part="snippet",
-        maxResults=1,
+        maxResults=max_results,
         type="video",
         fields="items(id(videoId),snippet(title))"
     )
     res = req.execute()
-    items = res.get('items', [])
+    return [{'video_id': item['id']['videoId'], 'title': item['snippet']['title']}
+            for item in res.get('items', [])]
+
+def youtube_search_top(youtube, query):
+    items = youtube_search_candidates(youtube, query, max_results=1)
     if not items:
         return None
-    video_id = items[0]['id']['videoId']
-    return f"https://www.youtube.com/watch?v={video_id}"
+    return video_url(items[0]['video_id'])
+
+def youtube_video_durations(youtube, video_ids):
+    """Return ``{video_id: seconds}`` for up to VIDEOS_LIST_BATCH IDs in one call."""
+    req = youtube.videos().list(
+        id=",".join(video_ids),
+        part="contentDetails",
+        maxResults=len(video_ids),
+        fields="items(id,contentDetails(duration))"
+    )
+    res = req.execute()
+    return {item['id']: parse_iso8601_duration(item['contentDetails']['duration'])
+            for item in res.get('items', [])}
+
+def parse_iso8601_duration(value):
+    match = re.fullmatch(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?", value or '')
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def words(text):
+    return set(re.findall(r"\w+", (text or '').casefold()))
+
+def score_candidate(track, candidate, rank, duration_s=None):
+    """Higher is better: title word overlap plus duration closeness (each 0..1)."""
+    wanted = words(search_query(track))
+    score = len(wanted & words(candidate['title'])) / len(wanted) if wanted else 0.0
+    if duration_s is not None and track.get('duration_ms'):
+        off_by = abs(duration_s - track['duration_ms'] / 1000)
+        score += max(0.0, 1 - off_by / DURATION_TOLERANCE_S)
+    # break ties in favour of YouTube's own ranking
+    return score - rank * 0.01
+
+def best_candidate(track, candidates, durations):
+    if not candidates:
+        return None
+    ranked = enumerate(candidates)
+    rank, best = max(ranked, key=lambda rc: score_candidate(track, rc[1], rc[0], durations.get(rc[1]['video_id'])))
+    return video_url(best['video_id'])
+
+class QuotaExhausted(Exception):
+    pass
+
+class QuotaBudget:
+    """Per-run YouTube quota allowance shared by all workers."""
+
+    def __init__(self, units):
+        self.units = units
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def spend(self, cost):
+        with self.lock:
+            if self.units is not None and self.spent + cost > self.units:
+                raise QuotaExhausted(f"quota budget of {self.units} units used up")
+            self.spent += cost
+        METRICS.incr('quota_units_total', cost)
+
+def plan_quota(tracks, cache=None, candidates=SEARCH_CANDIDATES, local_index=None):
+    """Project the quota a run over ``tracks`` will spend, before it starts."""
+    searches = sum(1 for t in tracks
+                   if (local_index is None or local_index.lookup(t)[0] is None)
+                   and (cache is None or not cache.contains(search_query(t))))
+    video_calls = -(-searches * candidates // VIDEOS_LIST_BATCH)
+    return {
+        'searches': searches,
+        'videos_list_calls': video_calls,
+        'units': searches * SEARCH_LIST_COST + video_calls * VIDEOS_LIST_COST,
+    }
+
+def print_quota_plan(plan, budget):
+    print(f"Projected quota: {plan['units']} units "
+          f"({plan['searches']} searches, {plan['videos_list_calls']} videos.list calls)")
+    if budget.units is not None and plan['units'] > budget.units - budget.spent:
+        affordable = (budget.units - budget.spent) // (SEARCH_LIST_COST + VIDEOS_LIST_COST)
+        print(f"Budget is {budget.units} units: about {affordable} tracks will be searched this run, "
+              "the rest stay pending for the next one.")
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def similarity(a, b):
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+class MatchIndex:
+    """Local index of tracks already matched in earlier CSV outputs.
+
+    Lookups try the exact title/artist, then the normalized title (variant
+    suffixes like "Remastered 2011" or "feat. X" removed), then a trigram
+    fuzzy match among the same artist's titles. Rows are keyed by artist, so
+    the fuzzy step only ever compares a handful of titles. A fuzzy hit also
+    needs the same numbers in both titles ("No. 1" is not "No. 2") and, when
+    both durations are known, lengths within DURATION_TOLERANCE_S.
+    """
+
+    def __init__(self, path, threshold=FUZZY_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " exact TEXT PRIMARY KEY,"
+            " artist TEXT NOT NULL,"
+            " title TEXT NOT NULL,"
+            " youtube_url TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS matches_artist_title ON matches(artist, title)")
+        # index files written by older versions of this script
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(matches)")}
+        if 'duration_ms' not in columns:
+            self.conn.execute("ALTER TABLE matches ADD COLUMN duration_ms INTEGER")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " path TEXT PRIMARY KEY,"
+            " mtime REAL NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def exact_key(track_name, artist):
+        return f"{(track_name or '').strip().casefold()}\x1f{(artist or '').strip().casefold()}"
+
+    def refresh(self, patterns=MATCH_INDEX_SOURCES):
+        """Ingest every CSV matching ``patterns`` that changed since last time."""
+        added = 0
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern)):
+                st = os.stat(path)
+                row = self.conn.execute("SELECT mtime, size FROM sources WHERE path = ?", (path,)).fetchone()
+                if row == (st.st_mtime, st.st_size):
+                    continue
+                with open(path, newline='', encoding='utf-8-sig') as f:
+                    added += self.add_rows(csv.DictReader(f))
+                with self.lock:
+                    self.conn.execute("INSERT OR REPLACE INTO sources (path, mtime, size) VALUES (?, ?, ?)",
+                                      (path, st.st_mtime, st.st_size))
+                    self.conn.commit()
+        return added
+
+    def add_rows(self, rows, batch=1000):
+        added = 0
+        pending = []
+        for row in rows:
+            if row.get('youtube_url') and row.get('track_name'):
+                pending.append(row)
+            if len(pending) >= batch:
+                added += self._insert(pending)
+                pending = []
+        return added + self._insert(pending)
+
+    def _insert(self, rows):
+        if not rows:
+            return 0
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO matches (exact, artist, title, youtube_url, duration_ms)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(self.exact_key(r['track_name'], r['artist']), fold(r['artist']),
+                  normalize_title(r['track_name']), r['youtube_url'], r.get('duration_ms') or None) for r in rows],
+            )
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def add(self, track, youtube_url):
+        if youtube_url:
+            self._insert([dict(track, youtube_url=youtube_url)])
+
+    def lookup(self, track):
+        """Return ``(url, how)`` with how in exact/normalized/fuzzy, or ``(None, None)``."""
+        artist = fold(track['artist'])
+        title = normalize_title(track['track_name'])
+        with self.lock:
+            row = self.conn.execute("SELECT youtube_url FROM matches WHERE exact = ?",
+                                    (self.exact_key(track['track_name'], track['artist']),)).fetchone()
+            if row:
+                return row[0], 'exact'
+            row = self.conn.execute("SELECT youtube_url FROM matches WHERE artist = ? AND title = ? LIMIT 1",
+                                    (artist, title)).fetchone()
+            if row:
+                return row[0], 'normalized'
+            candidates = self.conn.execute("SELECT title, youtube_url, duration_ms FROM matches WHERE artist = ?",
+                                           (artist,)).fetchall()
+        numbers = re.findall(r"\d+", title)
+        duration_ms = track.get('duration_ms')
+        best_url, best_score = None, 0.0
+        for other, url, other_ms in candidates:
+            if re.findall(r"\d+", other) != numbers:
+                continue
+            if duration_ms and other_ms and abs(duration_ms - other_ms) > DURATION_TOLERANCE_S * 1000:
+                continue
+            score = similarity(title, other)
+            if score > best_score:
+                best_url, best_score = url, score
+        if best_score >= self.threshold:
+            return best_url, 'fuzzy'
+        return None, None
+
+    def close(self):
+        self.conn.close()
+
+class SearchCache:
+    """Persistent SQLite cache of youtube_search_top results.
+
+    Keys are normalized queries. Empty results are cached as NULL so tracks
+    with no match don't cost another 100 quota units on the next run.
+    """
+
+    def __init__(self, path, ttl_days=CACHE_TTL_DAYS, negative_ttl_days=CACHE_NEGATIVE_TTL_DAYS,
+                 max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl_days * 86400
+        self.negative_ttl = negative_ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " query TEXT PRIMARY KEY,"
+            " youtube_url TEXT,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache(last_used)")
+        self.conn.commit()
+
+    def get(self, query):
+        """Return ``(True, url_or_None)`` on a fresh hit, ``(False, None)`` otherwise."""
+        key = normalize_query(query)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT youtube_url, created FROM search_cache WHERE query = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                url, created = row
+                if now - created < (self.ttl if url else self.negative_ttl):
+                    self.conn.execute("UPDATE search_cache SET last_used = ? WHERE query = ?", (now, key))
+                    self.hits += 1
+                    METRICS.incr('cache_hits_total')
+                    return True, url
+            self.misses += 1
+            METRICS.incr('cache_misses_total')
+            return False, None
+
+    def contains(self, query):
+        """True if ``query`` has a fresh entry; doesn't touch the hit counters."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT youtube_url, created FROM search_cache WHERE query = ?", (normalize_query(query),)
+            ).fetchone()
+        if row is None:
+            return False
+        return time.time() - row[1] < (self.ttl if row[0] else self.negative_ttl)
+
+    def put(self, query, url):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO search_cache (query, youtube_url, created, last_used) VALUES (?, ?, ?, ?)",
+                (normalize_query(query), url, now, now),
+            )
+            # commit per insert so a crash mid-run keeps what we already paid for
+            self.conn.commit()
+
+    def evict(self):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM search_cache WHERE created < ?"
+                " OR (youtube_url IS NULL AND created < ?)",
+                (time.time() - self.ttl, time.time() - self.negative_ttl),
+            )
+            self.conn.execute(
+                "DELETE FROM search_cache WHERE query IN ("
+                " SELECT query FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        self.conn.close()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class PlaylistState:
+    """Per-playlist sync state: last seen snapshot_id plus one row per track.
+
+    A track row stays ``pending`` until its YouTube lookup succeeds, so an
+    interrupted run picks up exactly where it stopped.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            " playlist_id TEXT PRIMARY KEY,"
+            " snapshot_id TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " playlist_id TEXT NOT NULL,"
+            " uri TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " track_name TEXT,"
+            " artist TEXT,"
+            " spotify_url TEXT,"
+            " youtube_url TEXT,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " isrc TEXT,"
+            " duration_ms INTEGER,"
+            " PRIMARY KEY (playlist_id, uri))"
+        )
+        # state files written by older versions of this script
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tracks)")}
+        for column, kind in (('isrc', 'TEXT'), ('duration_ms', 'INTEGER')):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE tracks ADD COLUMN {column} {kind}")
+        self.conn.commit()
+
+    def snapshot(self, playlist_id):
+        row = self.conn.execute(
+            "SELECT snapshot_id FROM playlists WHERE playlist_id = ?", (playlist_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def sync(self, playlist_id, snapshot_id, tracks):
+        """Diff ``tracks`` against the stored state; returns ``(added, removed)``."""
+        with self.lock:
+            known = {uri for (uri,) in self.conn.execute(
+                "SELECT uri FROM tracks WHERE playlist_id = ?", (playlist_id,))}
+            current = {}
+            for position, t in enumerate(tracks):
+                # a track listed twice is looked up once, at its first position
+                current.setdefault(t['uri'], (position, t))
+            removed = known - current.keys()
+            self.conn.executemany(
+                "DELETE FROM tracks WHERE playlist_id = ? AND uri = ?",
+                [(playlist_id, uri) for uri in removed],
+            )
+            self.conn.executemany(
+                "INSERT INTO tracks (playlist_id, uri, position, track_name, artist, spotify_url, isrc, duration_ms)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (playlist_id, uri) DO UPDATE SET"
+                " position = excluded.position, track_name = excluded.track_name,"
+                " artist = excluded.artist, spotify_url = excluded.spotify_url, isrc = excluded.isrc,"
+                " duration_ms = excluded.duration_ms",
+                [(playlist_id, uri, position, t['track_name'], t['artist'], t['spotify_url'],
+                  t.get('isrc', ''), t.get('duration_ms'))
+                 for uri, (position, t) in current.items()],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO playlists (playlist_id, snapshot_id) VALUES (?, ?)",
+                (playlist_id, snapshot_id),
+            )
+            self.conn.commit()
+            return len(current.keys() - known), len(removed)
+
+    def _iter(self, playlist_id, columns, where="", batch=500):
+        # keyset pagination keeps memory flat and never holds a read cursor
+        # open while workers are writing checkpoints
+        position = -1
+        while True:
+            with self.lock:
+                batch_rows = self.conn.execute(
+                    f"SELECT position, {columns} FROM tracks"
+                    f" WHERE playlist_id = ? AND position > ? {where} ORDER BY position LIMIT ?",
+                    (playlist_id, position, batch),
+                ).fetchall()
+            if not batch_rows:
+                return
+            for row in batch_rows:
+                yield row[1:]
+            position = batch_rows[-1][0]
+
+    def pending(self, playlist_id):
+        for uri, name, artist, url, isrc, duration_ms in self._iter(
+                playlist_id, "uri, track_name, artist, spotify_url, isrc, duration_ms", "AND status = 'pending'"):
+            yield {'uri': uri, 'track_name': name, 'artist': artist, 'spotify_url': url,
+                   'isrc': isrc or '', 'duration_ms': duration_ms}
+
+    def mark_done(self, playlist_id, uri, youtube_url):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE tracks SET youtube_url = ?, status = 'done' WHERE playlist_id = ? AND uri = ?",
+                (youtube_url, playlist_id, uri),
+            )
+            self.conn.commit()
+
+    def rows(self, playlist_id):
+        for name, artist, url, yt in self._iter(playlist_id, "track_name, artist, spotify_url, youtube_url"):
+            yield {'track_name': name, 'artist': artist, 'spotify_url': url, 'youtube_url': yt or ''}
+
+    def close(self):
+        self.conn.close()
+
+class RateLimiter:
+    """Token bucket shared by all search workers.
+
+    The refill rate is halved every time YouTube throttles us and creeps back
+    up towards ``rate`` after each successful call. A Retry-After header
+    pauses every worker, not just the one that got the response.
+    """
+
+    def __init__(self, rate, burst, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with METRICS.timer('rate_limit_wait'):
+            self._acquire()
+
+    def _acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    elapsed = now - max(self.updated, self.paused_until)
+                    self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def throttled(self, retry_after=None):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+# 403s with these reasons are per-second limits that clear up on their own;
+# any other 403 (quotaExceeded, forbidden, ...) is returned to the caller.
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+def is_rate_limited(error):
+    status = error.resp.status
+    if status == 429:
+        return True
+    if status == 403:
+        content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+def retry_after_seconds(error):
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def call_with_retry(fn, limiter, max_retries=SEARCH_MAX_RETRIES, stage='youtube_search'):
+    from googleapiclient.errors import HttpError
+    backoff = 1.0
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            with METRICS.timer(stage):
+                result = fn()
+        except HttpError as e:
+            if attempt == max_retries or not is_rate_limited(e):
+                METRICS.incr('api_errors_total', stage=stage)
+                raise
+            METRICS.incr('retries_total', stage=stage)
+            delay = retry_after_seconds(e) or backoff
+            limiter.throttled(delay)
+            backoff = min(backoff * 2, 60.0)
+            continue
+        limiter.success()
+        return result
+
+def iter_search_results(tracks, workers=SEARCH_WORKERS, rate=SEARCH_RATE, burst=SEARCH_BURST, cache=None,
+                        on_result=None, total=None, budget=None, candidates=SEARCH_CANDIDATES,
+                        local_index=None):
+    """Look up every track on YouTube, yielding ``(track, url_or_None)`` in input order.
+
+    ``tracks`` may be any iterable, including a generator still being fed by
+    Spotify paging. Each search asks for ``candidates`` videos, which are
+    then verified against the Spotify title and duration by
+    verify_candidates(). Tracks that ``local_index`` already matched
+    confidently never reach the API. ``on_result(track, url)`` is called
+    after every lookup that didn't fail, which lets callers checkpoint as
+    they go.
+    """
+    limiter = RateLimiter(rate, burst)
+    if budget is None:
+        budget = QuotaBudget(QUOTA_BUDGET)
+    if total is None:
+        total = len(tracks) if hasattr(tracks, '__len__') else '?'
+    # googleapiclient service objects are not thread-safe, so each worker
+    # builds its own client on first use
+    local = threading.local()
+
+    def search(numbered):
+        # returns (track, query, cached, value): value is the cached URL when
+        # cached is True, else the candidate list (None if the search failed)
+        i, t = numbered
+        q = search_query(t)
+        if local_index is not None:
+            url, how = local_index.lookup(t)
+            if url:
+                METRICS.incr('local_index_hits_total', stage=how)
+                print(f"[{i}/{total}] Local {how} match: {q}")
+                return t, q, True, url
+        if cache is not None:
+            hit, url = cache.get(q)
+            if hit:
+                print(f"[{i}/{total}] Cached: {q}")
+                return t, q, True, url
+        if not hasattr(local, 'youtube'):
+            local.youtube = build_youtube()
+        print(f"[{i}/{total}] Searching YouTube for: {q}")
+        try:
+            budget.spend(SEARCH_LIST_COST)
+            found = call_with_retry(lambda: youtube_search_candidates(local.youtube, q, candidates), limiter)
+        except QuotaExhausted:
+            # left unresolved, so it stays pending for the next run
+            return t, q, False, None
+        except Exception as e:
+            # errors are not cached, the track is retried on the next run
+            print("YouTube API error:", e)
+            return t, q, False, None
+        return t, q, False, found
+
+    searched = ordered_map(search, enumerate(tracks, start=1), workers)
+    with ProgressLine(total) if SHOW_PROGRESS else nullcontext():
+        for t, q, status, url in verify_candidates(searched, limiter, budget):
+            METRICS.incr('tracks_searched_total')
+            METRICS.incr(f'tracks_{status}_total')
+            if status == 'found' and cache is not None:
+                cache.put(q, url)
+            if status == 'found' and local_index is not None:
+                local_index.add(t, url)
+            if status != 'failed' and on_result is not None:
+                on_result(t, url)
+            yield t, url
+
+def verify_candidates(searched, limiter, budget, batch_size=VIDEOS_LIST_BATCH):
+    """Pick the best candidate for each search result, in order.
+
+    Candidates of consecutive tracks are pooled so one videos.list call
+    fetches the durations for up to ``batch_size`` of them. Cached and failed
+    results with no pooled search ahead of them are yielded right away, and
+    at most ``batch_size`` results wait in the pool, so cached stretches of
+    a playlist still stream. Yields ``(track, query, status, url)`` with
+    status ``'cached'``, ``'found'`` or ``'failed'``.
+    """
+    chunk = []
+    chunk_ids = 0
+    youtube = None
+
+    def flush():
+        nonlocal youtube
+        ids = [c['video_id'] for _, _, cached, found in chunk if not cached and found for c in found]
+        durations = {}
+        if ids:
+            if youtube is None:
+                youtube = build_youtube()
+            try:
+                budget.spend(VIDEOS_LIST_COST)
+                durations = call_with_retry(lambda: youtube_video_durations(youtube, ids), limiter,
+                                            stage='youtube_videos')
+            except Exception as e:
+                # fall back to title matching and search rank alone
+                print("YouTube videos.list error:", e)
+        for t, q, cached, value in chunk:
+            if cached:
+                yield t, q, 'cached', value
+            elif value is None:
+                yield t, q, 'failed', None
+            else:
+                yield t, q, 'found', best_candidate(t, value, durations)
+
+    for item in searched:
+        _, _, cached, value = item
+        size = len(value) if not cached and value else 0
+        if not size and not chunk:
+            # nothing waits for durations ahead of it; flush() makes no call
+            chunk = [item]
+            yield from flush()
+            chunk = []
+            continue
+        if chunk_ids + size > batch_size or len(chunk) >= batch_size:
+            yield from flush()
+            chunk, chunk_ids = [], 0
+        chunk.append(item)
+        chunk_ids += size
+    yield from flush()
+
+def output_row(track, youtube_url):
+    return {
+        'track_name': track['track_name'],
+        'artist': track['artist'],
+        'spotify_url': track['spotify_url'],
+        'youtube_url': youtube_url or ''
+    }
+
+def row_key(row):
+    return row['spotify_url'] or f"{row['track_name']}\x1f{row['artist']}"
+
+class CSVSink:
+    """Full CSV snapshot, written to a temporary file and swapped in when complete."""
+
+    suffix = ".csv"
+
+    def __init__(self, path, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+
+    def __enter__(self):
+        self.file = open(f"{self.path}.tmp", 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_COLUMNS)
+        self.writer.writeheader()
+        return self
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(f"{self.path}.tmp", self.path)
+        else:
+            # a crashed run leaves the previous output intact
+            os.remove(f"{self.path}.tmp")
+
+class JSONLSink:
+    """Append-only change log: one JSON line per new or changed row.
+
+    Rows that disappear from the playlist get a ``{"deleted": true}``
+    tombstone. Replaying the file and keeping the last line per
+    ``spotify_url`` gives the current result set; consumers tailing it only
+    ever read what changed.
+    """
+
+    suffix = ".jsonl"
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def digest(row):
+        return hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def __enter__(self):
+        self.known = {}  # row_key -> digest of its latest line
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    key = record.pop('key')
+                    record.pop('ts', None)
+                    if record.pop('deleted', False):
+                        self.known.pop(key, None)
+                    else:
+                        self.known[key] = self.digest(record)
+        self.seen = set()
+        self.file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def append(self, record):
+        self.file.write(json.dumps(dict(record, ts=round(time.time(), 3)), ensure_ascii=False) + "\n")
+
+    def write(self, row):
+        key = row_key(row)
+        self.seen.add(key)
+        digest = self.digest(row)
+        if self.known.get(key) != digest:
+            self.append(dict(row, key=key))
+            self.known[key] = digest
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            # only a complete run knows which rows are gone
+            for key in self.known.keys() - self.seen:
+                self.append({'key': key, 'deleted': True})
+        self.file.close()
+
+class SQLiteSink:
+    """``results`` table upserted on spotify_url; unchanged rows keep their updated_at."""
+
+    suffix = ".sqlite3"
+
+    def __init__(self, path, batch=500):
+        self.path = path
+        self.batch = batch
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " position INTEGER NOT NULL,"
+            " track_name TEXT,"
+            " artist TEXT,"
+            " spotify_url TEXT,"
+            " youtube_url TEXT,"
+            " updated_at REAL NOT NULL,"
+            " run_id REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_spotify_url ON results(spotify_url)")
+        self.run_id = time.time()
+        self.pending = []
+        self.position = 0
+        return self
+
+    def write(self, row):
+        self.pending.append((row_key(row), self.position, row['track_name'], row['artist'],
+                             row['spotify_url'], row['youtube_url'], self.run_id, self.run_id))
+        self.position += 1
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        self.conn.executemany(
+            "INSERT INTO results (key, position, track_name, artist, spotify_url, youtube_url, updated_at, run_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " position = excluded.position, run_id = excluded.run_id,"
+            " updated_at = CASE WHEN (track_name, artist, spotify_url, youtube_url)"
+            "   IS NOT (excluded.track_name, excluded.artist, excluded.spotify_url, excluded.youtube_url)"
+            "   THEN excluded.updated_at ELSE updated_at END,"
+            " track_name = excluded.track_name, artist = excluded.artist,"
+            " spotify_url = excluded.spotify_url, youtube_url = excluded.youtube_url",
+            self.pending,
+        )
+        self.conn.commit()
+        self.pending = []
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+            self.conn.execute("DELETE FROM results WHERE run_id != ?", (self.run_id,))
+            self.conn.commit()
+        self.conn.close()
+
+class ParquetSink:
+    """Parquet snapshot written in row groups of PARQUET_ROW_GROUP rows.
+
+    Parquet files can't be updated in place, so each run streams a fresh
+    snapshot and swaps it in. Readers can memory-map it and filter on
+    row-group statistics: ``pq.read_table(path, memory_map=True, filters=...)``.
+    """
+
+    suffix = ".parquet"
+
+    def __init__(self, path, row_group=PARQUET_ROW_GROUP):
+        self.path = path
+        self.row_group = row_group
+
+    def __enter__(self):
+        import pyarrow as pa  # optional dependency, only needed for this format
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([(name, pa.string()) for name in OUTPUT_COLUMNS] + [('position', pa.int64())])
+        self.writer = pq.ParquetWriter(f"{self.path}.tmp", self.schema)
+        self.pending = []
+        self.position = 0
+        return self
+
+    def write(self, row):
+        self.pending.append(dict(row, position=self.position))
+        self.position += 1
+        if len(self.pending) >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.writer.write_table(self.pa.Table.from_pylist(self.pending, schema=self.schema))
+            self.pending = []
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.writer.close()
+        if exc_type is None:
+            os.replace(f"{self.path}.tmp", self.path)
+        else:
+            os.remove(f"{self.path}.tmp")
+
+OUTPUT_SINKS = {'csv': CSVSink, 'jsonl': JSONLSink, 'sqlite': SQLiteSink, 'parquet': ParquetSink}
+
+def write_outputs(rows, base_path, formats=OUTPUT_FORMATS):
+    """Stream ``rows`` into one sink per format; returns ``(count, paths)``."""
+    sinks = [OUTPUT_SINKS[name](base_path + OUTPUT_SINKS[name].suffix) for name in formats]
+    count = 0
+    with ExitStack() as stack:
+        for sink in sinks:
+            stack.enter_context(sink)
+        for row in rows:
+            with METRICS.timer('output_row'):
+                for sink in sinks:
+                    sink.write(row)
+            count += 1
+    return count, [sink.path for sink in sinks]
+
+def write_rows_csv(rows, path=OUTPUT_CSV):
+    """Stream ``rows`` to ``path`` and return how many were written."""
+    with CSVSink(path) as sink:
+        for row in rows:
+            with METRICS.timer('output_row'):
+                sink.write(row)
+    return sink.count
+
+def load_results_dataframe(path=OUTPUT_CSV):
+    import pandas as pd  # optional dependency, only needed here
+    return pd.read_csv(path, encoding='utf-8-sig', keep_default_na=False)
+
+def refresh_playlist(sp, playlist_id, state):
+    """Diff the playlist against ``state`` unless its snapshot_id is unchanged."""
+    snapshot_id = sp.playlist(playlist_id, fields="snapshot_id")['snapshot_id']
+    if snapshot_id == state.snapshot(playlist_id):
+        print(f"Playlist {playlist_id} unchanged since last run (snapshot {snapshot_id}).")
+        return
+    print(f"Fetching playlist {playlist_id} tracks from Spotify...")
+    tracks = fetch_all_playlist_tracks(sp, playlist_id)
+    added, removed = state.sync(playlist_id, snapshot_id, tracks)
+    print(f"Found {len(tracks)} tracks: {added} added, {removed} removed since last run.")
+
+def search_pending(playlist_ids, state, cache=None, local_index=None):
+    """Search every pending track of ``playlist_ids``, each distinct song once.
+
+    Pending tracks (including ones left over from an interrupted or failed
+    run) are grouped by track_key(); a single lookup result is checkpointed
+    into every playlist that contains the song.
+    """
+    index = {}  # track_key -> (track, [(playlist_id, uri), ...])
+    for playlist_id in playlist_ids:
+        for t in state.pending(playlist_id):
+            index.setdefault(track_key(t), (t, []))[1].append((playlist_id, t['uri']))
+    pending = sum(len(owners) for _, owners in index.values())
+    print(f"{pending} tracks to search, {len(index)} unique.")
+    budget = QuotaBudget(QUOTA_BUDGET)
+    print_quota_plan(plan_quota([t for t, _ in index.values()], cache, local_index=local_index), budget)
+
+    def checkpoint(t, url):
+        for playlist_id, uri in index[track_key(t)][1]:
+            state.mark_done(playlist_id, uri, url)
+
+    for _ in iter_search_results((t for t, _ in index.values()), cache=cache, total=len(index),
+                                 on_result=checkpoint, budget=budget, local_index=local_index):
+        pass
+    print(f"Quota used: {budget.spent} units")
+
+def sync_playlist(sp, playlist_id, state, cache=None, local_index=None):
+    """Incrementally bring ``state`` up to date and return an iterator over all output rows."""
+    refresh_playlist(sp, playlist_id, state)
+    search_pending([playlist_id], state, cache=cache, local_index=local_index)
+    return state.rows(playlist_id)
+
+def run_batch(sp, playlist_ids, state, cache=None, output_dir=BATCH_OUTPUT_DIR, local_index=None):
+    """Sync several playlists, sharing lookups, and write one output set per playlist."""
+    for playlist_id in playlist_ids:
+        refresh_playlist(sp, playlist_id, state)
+    search_pending(playlist_ids, state, cache=cache, local_index=local_index)
+    os.makedirs(output_dir, exist_ok=True)
+    for playlist_id in playlist_ids:
+        count, paths = write_outputs(state.rows(playlist_id), os.path.join(output_dir, playlist_id))
+        print(f"Saved {count} rows to", ", ".join(paths))
+
+def warm_start():
+    """Everything a run loads before its first search, minus network calls."""
+    import spotipy.oauth2  # noqa: F401
+    build_youtube()
+
+def startup_report(top=15):
+    """Print an ``-X importtime`` breakdown of warm_start() in a fresh interpreter."""
+    module_dir, filename = os.path.split(os.path.abspath(__file__))
+    module = os.path.splitext(filename)[0]
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         f"import sys; sys.path.insert(0, {module_dir!r}); import {module}; {module}.warm_start()"],
+        capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "startup check failed")
+        return
+    imports = []
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if name.startswith('  '):
+            continue  # nested import, already counted in its parent's cumulative time
+        imports.append((int(parts[1]), name.strip()))
+    imports.sort(reverse=True)
+    print(f"Startup: {elapsed * 1000:.0f} ms wall, {sum(us for us, _ in imports) / 1000:.0f} ms in imports")
+    for us, name in imports[:top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
 
 def main():
+    args = sys.argv[1:]
+    if '--startup-report' in args:
+        startup_report()
+        return
+
     # sanity check
     if "YOUR_SPOTIFY_CLIENT_ID" in SPOTIFY_CLIENT_ID or "YOUR_YOUTUBE_API_KEY" in YOUTUBE_API_KEY:
         raise SystemExit("Please set your Spotify and YouTube API credentials in the script.")
 
     sp = get_spotify_client()
-    print("Fetching playlist tracks from Spotify...")
-    tracks = fetch_all_playlist_tracks(sp, PLAYLIST_ID)
-    print(f"Found {len(tracks)} tracks.")
-
-    # build youtube client
-    youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+    cache = SearchCache(CACHE_PATH) if CACHE_PATH else None
+    local_index = MatchIndex(MATCH_INDEX_PATH) if MATCH_INDEX_PATH else None
+    if local_index is not None:
+        print(f"Match index: {local_index.refresh()} rows learned from earlier outputs.")
+    state = None
+    playlist_ids = args or PLAYLIST_IDS
+    try:
+        if playlist_ids:
+            # batch mode needs the track table even for a full rebuild
+            state = PlaylistState(SYNC_STATE_PATH if INCREMENTAL else ":memory:")
+            run_batch(sp, playlist_ids, state, cache=cache, local_index=local_index)
+            return
+        if INCREMENTAL:
+            state = PlaylistState(SYNC_STATE_PATH)
+            rows = sync_playlist(sp, PLAYLIST_ID, state, cache=cache, local_index=local_index)
+        else:
+            print("Fetching playlist tracks from Spotify...")
+            # searching starts while later pages are still downloading
+            results = iter_search_results(iter_playlist_tracks(sp, PLAYLIST_ID), cache=cache,
+                                          local_index=local_index)
+            rows = (output_row(t, url) for t, url in results)
+        count, paths = write_outputs(rows, os.path.splitext(OUTPUT_CSV)[0])
+    finally:
+        if state is not None:
+            state.close()
+        if local_index is not None:
+            local_index.close()
+        if cache is not None:
+            print(f"Search cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.0%} hit rate)")
+            cache.close()
+        METRICS.write()
 
-    results = []
-    for i, t in enumerate(tracks, start=1):
-        q = f"{t['track_name']} {t['artist']}"
-        print(f"[{i}/{len(tracks)}] Searching YouTube for: {q}")
-        try:
-            yt_url = youtube_search_top(youtube, q)
-            # simple throttling to be polite on API
-            time.sleep(0.1)
-        except Exception as e:
-            print("YouTube API error:", e)
-            yt_url = None
-        results.append({
-            'track_name': t['track_name'],
-            'artist': t['artist'],
-            'spotify_url': t['spotify_url'],
-            'youtube_url': yt_url or ''
-        })
-
-    # Save CSV
-    df = pd.DataFrame(results)
-    df.to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig')
-    print("Saved results to", OUTPUT_CSV)
-    print(df.head())
+    print(f"Saved {count} rows to", ", ".join(paths))
+    if SHOW_DATAFRAME and 'csv' in OUTPUT_FORMATS:
+        print(load_results_dataframe(OUTPUT_CSV).head())
 
 if __name__ == "__main__":
     main()
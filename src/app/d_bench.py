@@ -0,0 +1,345 @@
+"""
+Offline benchmark for the playlist -> YouTube pipeline in d.py.
+
+Starts two local HTTP servers that stand in for the Spotify Web API
+(playlist snapshot + playlist_items paging with `next` links) and the
+YouTube Data API (search.list and videos.list), then runs d.py against them
+in a fresh child process per case and reports tracks/sec, peak RSS and API
+calls per track.
+
+Usage:
+    python d_bench.py
+    python d_bench.py --sizes 100,1000,50000 --modes serial,concurrent --latency-ms 80 --error-rate 0.02
+    python d_bench.py --json bench_results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+MODES = ("serial", "concurrent", "cached", "incremental")
+DEFAULT_SIZES = "100,1000,10000"
+INCREMENTAL_CHURN = 0.01  # share of the playlist added between the two incremental passes
+
+# --------- fake API servers ---------
+
+class FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency_ms=0, error_rate=0.0, retry_after=1):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.calls)
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_bench/stats":
+            return self.send_json(200, self.server.stats())
+        name, handler = self.route(url.path)
+        if handler is None:
+            return self.send_json(404, {"error": {"message": f"no route for {url.path}"}})
+        self.server.count(name)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count("throttled")
+            return self.send_json(429, self.throttled_body(),
+                                  headers={"Retry-After": str(self.server.retry_after)})
+        return self.send_json(200, handler(url.path, query))
+
+    def route(self, path):
+        raise NotImplementedError
+
+    def throttled_body(self):
+        return {"error": {"status": 429, "message": "rate limited"}}
+
+def bench_playlist_size(playlist_id):
+    # playlist IDs look like "bench1000", the number is the track count
+    return int(playlist_id[len("bench"):])
+
+def bench_track(i):
+    return {
+        "name": f"Track {i}",
+        "artists": [{"name": f"Artist {i % 997}"}],
+        "external_urls": {"spotify": f"https://open.spotify.com/track/bench{i}"},
+        "href": f"https://api.spotify.com/v1/tracks/bench{i}",
+        "uri": f"spotify:track:bench{i}",
+        "external_ids": {"isrc": f"BENCH{i:07d}"},
+        "duration_ms": 180000 + (i % 120) * 1000,
+    }
+
+class SpotifyHandler(FakeAPIHandler):
+    """Serves GET /v1/playlists/<id> and GET /v1/playlists/<id>/tracks.
+
+    GET /_bench/grow?playlist=<id>&count=<n> appends tracks to a playlist and
+    changes its snapshot_id, which is how the incremental mode simulates churn.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/_bench/grow":
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            growth = self.server.growth
+            growth[query["playlist"]] = growth.get(query["playlist"], 0) + int(query["count"])
+            return self.send_json(200, {"grown": growth[query["playlist"]]})
+        return super().do_GET()
+
+    def route(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[:2] == ["v1", "playlists"]:
+            return "playlist", self.playlist
+        if len(parts) == 4 and parts[:2] == ["v1", "playlists"] and parts[3] == "tracks":
+            return "playlist_items", self.playlist_items
+        return None, None
+
+    def playlist_total(self, playlist_id):
+        return bench_playlist_size(playlist_id) + self.server.growth.get(playlist_id, 0)
+
+    def playlist(self, path, query):
+        playlist_id = path.strip("/").split("/")[2]
+        return {"snapshot_id": f"{playlist_id}-{self.playlist_total(playlist_id)}"}
+
+    def playlist_items(self, path, query):
+        playlist_id = path.strip("/").split("/")[2]
+        total = self.playlist_total(playlist_id)
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", 100)), 100)
+        end = min(offset + limit, total)
+        next_url = None
+        if end < total:
+            params = dict(query, offset=end, limit=limit)
+            next_url = f"{self.server.base_url}{path.lstrip('/')}?{urlencode(params)}"
+        return {
+            "items": [{"track": bench_track(i)} for i in range(offset, end)],
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next": next_url,
+        }
+
+class YouTubeHandler(FakeAPIHandler):
+    """Serves search.list and videos.list under any prefix ending in /search or /videos."""
+
+    def route(self, path):
+        if path.endswith("/search"):
+            return "search.list", self.search
+        if path.endswith("/videos"):
+            return "videos.list", self.videos
+        return None, None
+
+    def throttled_body(self):
+        return {"error": {"code": 429, "message": "rate limited",
+                          "errors": [{"reason": "rateLimitExceeded"}]}}
+
+    def search(self, path, query):
+        q = query.get("q", "")
+        digest = hashlib.sha1(q.encode('utf-8')).hexdigest()[:9]
+        return {"items": [
+            {"id": {"videoId": f"{digest}{k:02d}"}, "snippet": {"title": f"{q} (video {k})"}}
+            for k in range(int(query.get("maxResults", 5)))
+        ]}
+
+    def videos(self, path, query):
+        ids = [i for i in query.get("id", "").split(",") if i]
+        return {"items": [
+            {"id": video_id, "contentDetails": {"duration": f"PT3M{int(video_id[-2:]) * 7 % 60}S"}}
+            for video_id in ids
+        ]}
+
+def start_servers(latency_ms, error_rate, retry_after):
+    spotify = FakeAPIServer(SpotifyHandler, latency_ms, error_rate, retry_after)
+    spotify.growth = {}
+    youtube = FakeAPIServer(YouTubeHandler, latency_ms, error_rate, retry_after)
+    for server in (spotify, youtube):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return spotify, youtube
+
+# --------- one benchmark case (runs in a child process) ---------
+
+def http_get_json(url):
+    from urllib.request import urlopen
+    with urlopen(url, timeout=30) as res:
+        return json.loads(res.read().decode('utf-8'))
+
+def api_calls(spotify_url, youtube_url):
+    calls = {}
+    for base in (spotify_url, youtube_url):
+        for name, count in http_get_json(f"{base}_bench/stats").items():
+            calls[name] = calls.get(name, 0) + count
+    return calls
+
+def run_case(mode, size, spotify_url, youtube_url, workers, rate, workdir=None, warm_up=False):
+    """Run one case and return its result, or with ``warm_up`` only prepare
+    ``workdir`` (the cache or sync state a later measured run starts from)."""
+    import resource
+    import d
+    import spotipy
+
+    workdir = workdir or tempfile.mkdtemp(prefix=f"d_bench_{mode}_{size}_")
+    os.chdir(workdir)
+    d.YOUTUBE_API_KEY = "bench"
+    d.YOUTUBE_API_ENDPOINT = youtube_url
+    sp = spotipy.Spotify(auth="bench", retries=3, status_retries=3, backoff_factor=0.1)
+    sp.prefix = f"{spotify_url}v1/"
+    # every case starts from a fresh working directory and the driver resets
+    # server-side growth, so no state leaks between cases
+    playlist_id = f"bench{size}"
+    serial = mode == "serial"
+    page_workers = 1 if serial else d.SPOTIFY_PAGE_WORKERS
+    search_kwargs = dict(workers=1 if serial else workers, rate=rate, burst=max(1, int(rate)),
+                         budget=d.QuotaBudget(None))
+
+    def full_run(cache=None):
+        results = d.iter_search_results(d.iter_playlist_tracks(sp, playlist_id, workers=page_workers),
+                                        cache=cache, **search_kwargs)
+        return d.write_rows_csv((d.output_row(t, url) for t, url in results), "out.csv")
+
+    def incremental_run(state):
+        d.refresh_playlist(sp, playlist_id, state)
+        pending = list(state.pending(playlist_id))
+        for _ in d.iter_search_results(pending, total=len(pending),
+                                       on_result=lambda t, url: state.mark_done(playlist_id, t['uri'], url),
+                                       **search_kwargs):
+            pass
+        return d.write_rows_csv(state.rows(playlist_id), "out.csv")
+
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        cache = d.SearchCache("cache.sqlite3") if mode == "cached" else None
+        state = d.PlaylistState("state.sqlite3") if mode == "incremental" else None
+        if warm_up:
+            if cache is not None:
+                full_run(cache)
+            elif state is not None:
+                incremental_run(state)  # initial sync
+                http_get_json(f"{spotify_url}_bench/grow?playlist={playlist_id}"
+                              f"&count={max(1, int(size * INCREMENTAL_CHURN))}")
+            return None
+
+        before = api_calls(spotify_url, youtube_url)
+        started = time.perf_counter()
+        rows = incremental_run(state) if state is not None else full_run(cache)
+        elapsed = time.perf_counter() - started
+        after = api_calls(spotify_url, youtube_url)
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    calls = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+    calls = {name: count for name, count in calls.items() if count}
+    requests = sum(count for name, count in calls.items() if name != "throttled")
+    return {
+        "mode": mode,
+        "size": size,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "tracks_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "api_calls": calls,
+        "api_calls_per_track": round(requests / rows, 3) if rows else None,
+    }
+
+# --------- driver ---------
+
+def run_in_child(mode, size, spotify, youtube, args):
+    # the warm-up pass of the cached and incremental modes gets a child of its
+    # own, so the measured child's peak RSS covers the measured pass only
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix=f"d_bench_{mode}_{size}_")
+    for warm_up in ([True] if mode in ("cached", "incremental") else []) + [False]:
+        code = (
+            f"import sys, json; sys.path.insert(0, {module_dir!r}); import d_bench; "
+            f"print(json.dumps(d_bench.run_case({mode!r}, {size}, {spotify.base_url!r}, "
+            f"{youtube.base_url!r}, {args.workers}, {args.rate}, {workdir!r}, {warm_up})))"
+        )
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"mode": mode, "size": size, "error": proc.stderr.strip().splitlines()[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def print_header():
+    print(f"{'mode':<12} {'tracks':>7} {'seconds':>9} {'tracks/s':>10} {'peak RSS':>10} {'calls/track':>12}  throttled")
+
+def print_result(r):
+    if "error" in r:
+        print(f"{r['mode']:<12} {r['size']:>7}  error: {r['error']}")
+        return
+    print(f"{r['mode']:<12} {r['rows']:>7} {r['seconds']:>9.2f} {r['tracks_per_sec']:>10.1f} "
+          f"{r['peak_rss_mb']:>8.1f}MB {r['api_calls_per_track']:>12.3f}  {r['api_calls'].get('throttled', 0)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated playlist sizes (100 to 50000)")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {','.join(MODES)}")
+    parser.add_argument("--latency-ms", type=float, default=50, help="per-request latency of the fake APIs")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--workers", type=int, default=8, help="search workers for the non-serial modes")
+    parser.add_argument("--rate", type=float, default=1000.0, help="search rate limit (requests/sec)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    spotify, youtube = start_servers(args.latency_ms, args.error_rate, args.retry_after)
+    print(f"Fake Spotify at {spotify.base_url}, fake YouTube at {youtube.base_url} "
+          f"({args.latency_ms:g} ms latency, {args.error_rate:.1%} 429s)\n")
+    print_header()
+    results = []
+    for size in sizes:
+        for mode in modes:
+            spotify.growth.clear()
+            results.append(run_in_child(mode, size, spotify, youtube, args))
+            print_result(results[-1])
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print("Saved results to", args.json)
+
+
+if __name__ == "__main__":
+    main()